@@ -1,18 +1,34 @@
 import streamlit as st
 import datetime as dt
+import time
 import pandas as pd
-from src.data_loader import load_and_preprocess_data, filter_data
-from src.summary import monthly_summary_by_channel, monthly_customer_stats
-from src.plots import plot_combined_by_channel, plot_customers_with_new_and_total, plot_pie, plot_cohort_heatmap
-from src.cohort import run_cohort_analysis
-from src.utils import group_top_n_with_other, get_summary
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from src.data_loader import filter_data
+from src.summary import monthly_summary_by_channel, monthly_customer_stats, customer_table
+from src.plots import plot_combined_by_channel, plot_customers_with_new_and_total, plot_pie, plot_status_bar, plot_cohort_heatmap
+from src.utils import group_top_n_with_other_batch, get_summary
+from src.registry import registry, dataset_key
+from src.ingest import start_ingestion, get_ingestion, finish_ingestion
+from src.shared import shared_enabled
+from src.kpi import KpiEngine, kpi_windows, format_breakdown, customer_breakdown, normalize_status
+from src.bitmaps import CustomerBitmapIndex
+from src.cohort import CohortEngine, GRANULARITIES, METRICS
+from src.comparison import CityMonthMatrix
+from src.hierarchy import GeoHierarchy
+from src.promo import promo_analytics
+from src.sketches import SketchIndex
+from src.sampling import CustomerSample, SAMPLE_RATE, SAMPLE_AUTO_ROWS, weighted_counts, weighted_rows, with_customer_weights
+from src.warmup import start_warmup, get_artifact, warmup_progress
 
 st.set_page_config(page_title="Easy Dashboard", layout="wide")
 st.title("Easy Dashboard")
 
 # Sidebar controls
 st.sidebar.header("Upload & Filter Data")
-uploaded_file = st.sidebar.file_uploader("Upload CSV file", type=["csv"])
+uploaded_files = st.sidebar.file_uploader(
+    "Upload CSV files", type=["csv", "gz", "zip"], accept_multiple_files=True,
+    help="One or more exports, e.g. one per month; gzip and zip archives are decompressed while parsing"
+)
 
 min_date = dt.date(2024, 5, 1)
 max_date = dt.date(2025, 6, 30)
@@ -20,132 +36,170 @@ start_date = st.sidebar.date_input("Start date", min_value=min_date, max_value=m
 end_date = st.sidebar.date_input("End date", min_value=min_date, max_value=max_date, value=max_date)
 country = st.sidebar.selectbox("Country", options=["All", "Tunisia", "Morocco"])
 
-if uploaded_file:
-    # Read the file once and create both versions
-    df_raw = pd.read_csv(uploaded_file)
-    
-    # Create processed version (with renamed columns)
-    df = df_raw.copy()
-    df.rename(columns={
-        'id_client': 'customer_id',
-        'createdAt': 'transaction_date'
-    }, inplace=True)
-    # Convert to datetime and remove timezone
-    df['transaction_date'] = pd.to_datetime(df['transaction_date'])
-    df['transaction_date'] = df['transaction_date'].dt.tz_localize(None)
-    # Extract transaction_month
-    df['transaction_month'] = df['transaction_date'].apply(lambda x: dt.datetime(x.year, x.month, 1))
-    # Convert amountToSend to numeric, handling any non-numeric values
-    if 'amountToSend' in df.columns:
-        df['amountToSend'] = pd.to_numeric(df['amountToSend'], errors='coerce')
+def get_session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+if uploaded_files:
+    # Hash the upload once per session; identical files share one cached dataset across sessions
+    file_id = tuple(getattr(uploaded_file, 'file_id', uploaded_file.name) for uploaded_file in uploaded_files)
+    if st.session_state.get('dataset_file_id') != file_id:
+        st.session_state['dataset_file_id'] = file_id
+        st.session_state['dataset_key'] = dataset_key([uploaded_file.getvalue() for uploaded_file in uploaded_files])
+    key = st.session_state['dataset_key']
+    session_id = get_session_id()
+    job = get_ingestion(key)
+    entry = registry.get(key, session_id) if job is None else None
+    loading = False
+    if entry is None:
+        # Parse off the script thread; until the whole file is in, render from the ingested prefix
+        job = job or start_ingestion(key, [(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files])
+        if job.done:
+            finish_ingestion(key)
+            if job.complete_error is not None:
+                st.sidebar.warning(f"Could not publish the dataset to the shared store: {job.complete_error}")
+            # Prefer the memory-mapped copy when the job published one to the shared store
+            entry = registry.get(key, session_id) or registry.put(key, job.result(), session_id)
+        else:
+            loading = True
+            upload_label = uploaded_files[0].name if len(uploaded_files) == 1 else f"{len(uploaded_files)} files"
+            st.progress(job.progress, text=f"Loading {upload_label}: {job.rows:,} rows, {job.bytes_read / 2**20:,.1f} / {job.total_bytes / 2**20:,.1f} MB")
+            snapshot = job.snapshot()
+            if snapshot.empty:
+                time.sleep(0.5)
+                st.rerun()
+            entry = job.partial_entry(key)
+    df = entry.frame()
+    unparsed = df.attrs.get('unparsed_timestamps')
+    if unparsed:
+        st.sidebar.warning(
+            f"{unparsed['rows']:,} rows have a `{unparsed['column']}` timestamp that could not be parsed "
+            f"and are left out of date-based views, e.g. {', '.join(repr(example) for example in unparsed['examples'])}"
+        )
     
-    # Create original version (preserving column names)
-    original_df = df_raw.copy()
-    # Convert to datetime and remove timezone
-    original_df['transaction_date'] = pd.to_datetime(original_df['createdAt'] if 'createdAt' in original_df.columns else original_df['transaction_date'])
-    original_df['transaction_date'] = original_df['transaction_date'].dt.tz_localize(None)
-    # Extract transaction_month
-    original_df['transaction_month'] = original_df['transaction_date'].apply(lambda x: dt.datetime(x.year, x.month, 1))
-    # Convert amountToSend to numeric, handling any non-numeric values
-    if 'amountToSend' in original_df.columns:
-        original_df['amountToSend'] = pd.to_numeric(original_df['amountToSend'], errors='coerce')
+    cache_stats = registry.stats()
+    st.sidebar.caption(
+        f"Shared dataset cache: {cache_stats['datasets']} datasets, "
+        f"{cache_stats['bytes'] / 2**20:,.0f} / {cache_stats['max_bytes'] / 2**20:,.0f} MB · "
+        f"{cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['evictions']} evictions"
+        + (f", {cache_stats['shared_loads']} mapped from the shared store" if shared_enabled() else "")
+    )
     
     # Map country names to codes if needed
     country_map = {"Tunisia": "TUN", "Morocco": "MAC"}
     selected_country = None if country == "All" else country_map[country]
+    filter_key = (selected_country, start_date, end_date)
+    
+    # Sampling mode: explore a stratified customer sample, recompute exactly on demand
+    sampling = False
+    if not loading:
+        sampling = st.sidebar.toggle(
+            "Sampling mode", value=len(df) >= SAMPLE_AUTO_ROWS, key="sampling_mode",
+            help=f"Compute every view from a {SAMPLE_RATE:.0%} stratified sample of customers; counts are scaled back to the full data"
+        )
+        # Exact holds across reruns for the filter it was pressed on; a new filter or
+        # switching sampling off returns to the sample
+        if not sampling or st.session_state.get('exact_view', filter_key) != filter_key:
+            st.session_state.pop('exact_view', None)
+        if sampling and 'exact_view' not in st.session_state and st.sidebar.button("Exact", help="Recompute the current view on the full data"):
+            st.session_state['exact_view'] = filter_key
+        if 'exact_view' in st.session_state:
+            sampling = False
+            st.sidebar.caption("Exact view on all rows; changing the filter returns to the sample.")
+    if sampling:
+        sample = entry.index(('sample', SAMPLE_RATE), lambda: CustomerSample(df, entry))
+        entry = sample.entry
+        df = entry.frame()
+        st.info(
+            f"Sampling mode: figures are estimated from {len(sample.frame):,} of {sample.rows_total:,} rows "
+            f"(a {sample.rate:.0%} customer sample stratified by country and first month) and scaled to the full data. "
+            "Press Exact in the sidebar to recompute this view on all rows."
+        )
     
     # Convert dates to date-only for filtering (like Excel)
     start_datetime = dt.datetime.combine(start_date, dt.time())
     end_datetime = dt.datetime.combine(end_date, dt.time(23, 59, 59))
     df_filtered = filter_data(df, start_datetime, end_datetime, selected_country)
     
-    # Alternative: filter by date only (like Excel might do)
-    df_filtered_date_only = df.copy()
-    if selected_country:
-        df_filtered_date_only = df_filtered_date_only[df_filtered_date_only['country'] == selected_country]
-    df_filtered_date_only = df_filtered_date_only[
-        (df_filtered_date_only['transaction_date'].dt.date >= start_date) & 
-        (df_filtered_date_only['transaction_date'].dt.date <= end_date)
-    ]
+    if df_filtered.empty:
+        if loading:
+            time.sleep(0.5)
+            st.rerun()
+        st.info("No transactions in the selected date range and country.")
+        st.stop()
+    
+    def status_counts_of(frame, distinct=None):
+        # Rows (or distinct customers) per status, with both spellings of cancelled merged
+        return weighted_counts(frame.assign(status=normalize_status(frame['status'])), 'status', distinct)
+    
+    # Warm up the expensive per-filter artifacts in the background, in priority order
+    if not loading:
+        start_warmup(entry, filter_key, df_filtered, session_id)
+    
+    def wait_for_artifact(name, label):
+        artifact = get_artifact(entry, name, filter_key)
+        if artifact is not None:
+            return artifact
+        def show_pending():
+            if get_artifact(entry, name, filter_key) is not None:
+                st.rerun()
+            ready, total = warmup_progress(entry, filter_key)
+            st.progress(ready / total, text=f"Preparing {label} in the background ({ready}/{total} artifacts ready)…")
+        if hasattr(st, 'fragment'):
+            # Poll without rerunning the whole script; rerun once the artifact lands
+            st.fragment(show_pending, run_every=1)()
+        else:
+            show_pending()
+            st.button("Refresh", key=f"refresh_{name}")
+        return None
     
     # KPI Section
+    # Per-day prefix sums make every KPI window an O(1) lookup
+    kpi_engine = entry.index(('kpi', selected_country), lambda: KpiEngine(df if selected_country is None else df[df['country'] == selected_country]))
     # Calculate KPIs for today (latest day in dataset)
-    latest_date = df_filtered['transaction_date'].max().date()
+    latest_date = kpi_engine.latest_day(start_date, end_date)
+    windows = kpi_windows(latest_date, start_date, end_date)
+    window_totals = {name: kpi_engine.window(lo, hi) for name, (lo, hi) in windows.items()}
     today_data = df_filtered[df_filtered['transaction_date'].dt.date == latest_date]
     
     # Calculate KPIs for this month (current month until now)
     current_month_start = dt.datetime(latest_date.year, latest_date.month, 1)
     this_month_data = df_filtered[df_filtered['transaction_date'] >= current_month_start]
     
-    # Calculate KPIs with status breakdown
-    def get_status_breakdown(data, metric_type='transactions'):
-        if data.empty:
-            return "0 total (0 completed, 0 in progress, 0 cancelled)"
-        
-        if 'status' not in data.columns:
-            total = len(data) if metric_type == 'transactions' else data['customer_id'].nunique()
-            return f"{total:,} total"
-        
-        # Count by status - handle both spellings
-        status_counts = data['status'].value_counts()
-        completed = status_counts.get('complete', 0)
-        in_progress = status_counts.get('in progress', 0)
-        cancelled = status_counts.get('cancelled', 0) + status_counts.get('canceled', 0)  # Handle both spellings
-        total = completed + in_progress + cancelled
-        
-        return f"{total:,} total ({completed:,} completed, {in_progress:,} in progress, {cancelled:,} cancelled)"
+    # Distinct customers come from per-day customer bitmaps: OR over the window, then popcount
+    customer_index = entry.index(('customer_bitmaps',), lambda: CustomerBitmapIndex(df))
+    bitmap_memory = customer_index.memory_report()
+    st.sidebar.caption(
+        f"Customer bitmap index: {bitmap_memory['customers']:,} customers, {bitmap_memory['bytes'] / 2**20:,.1f} MB "
+        f"({bitmap_memory['sparse']:,} sparse / {bitmap_memory['dense']:,} dense day bitmaps)"
+    )
     
-    def get_customer_status_breakdown(data):
-        if data.empty:
-            return "0 total (0 completed, 0 in progress, 0 cancelled)"
-        
-        if 'status' not in data.columns:
-            return f"{data['customer_id'].nunique():,} total"
-        
-        # Get unique customers by status - handle both spellings
-        completed_customers = data[data['status'] == 'complete']['customer_id'].nunique()
-        in_progress_customers = data[data['status'] == 'in progress']['customer_id'].nunique()
-        cancelled_customers = data[(data['status'] == 'cancelled') | (data['status'] == 'canceled')]['customer_id'].nunique()
-        total_customers = data['customer_id'].nunique()
-        
-        return f"{total_customers:,} total ({completed_customers:,} completed, {in_progress_customers:,} in progress, {cancelled_customers:,} cancelled)"
+    # Calculate KPIs with status breakdown
+    def get_customer_status_breakdown(window_start, window_end, exclude=None):
+        values = customer_breakdown(customer_index, window_start, window_end, selected_country, exclude)
+        return format_breakdown(values, 'status' in df.columns)
     
-    def get_financial_status_breakdown(data):
-        if data.empty:
-            return "€0 total (€0 completed, €0 in progress, €0 cancelled)"
-        
-        if 'status' not in data.columns:
-            total_amount = data['amountToSend'].sum() if 'amountToSend' in data.columns else 0
-            return f"€{total_amount:,.0f} total"
-        
-        # Sum amounts by status - handle both spellings
-        completed_amount = data[data['status'] == 'complete']['amountToSend'].sum() if 'amountToSend' in data.columns else 0
-        in_progress_amount = data[data['status'] == 'in progress']['amountToSend'].sum() if 'amountToSend' in data.columns else 0
-        cancelled_amount = data[(data['status'] == 'cancelled') | (data['status'] == 'canceled')]['amountToSend'].sum() if 'amountToSend' in data.columns else 0
-        total_amount = completed_amount + in_progress_amount + cancelled_amount
-        
-        return f"€{total_amount:,.0f} total (€{completed_amount:,.0f} completed, €{in_progress_amount:,.0f} in progress, €{cancelled_amount:,.0f} cancelled)"
+    def customers_before(day):
+        # Customers already active in the selected range before the given day
+        return customer_index.bitmap(start_date, day - dt.timedelta(days=1), selected_country)
     
     # Calculate breakdowns for today
-    today_transactions_breakdown = get_status_breakdown(today_data, 'transactions')
-    today_customers_breakdown = get_customer_status_breakdown(today_data)
+    today_transactions_breakdown = format_breakdown(window_totals['today']['transactions'], kpi_engine.has_status)
+    today_customers_breakdown = get_customer_status_breakdown(*windows['today'])
     
     # Calculate new customers for today (customers whose first transaction was today)
-    first_tx_dates = df_filtered.groupby('customer_id')['transaction_date'].min().reset_index()
-    today_new_customers_data = first_tx_dates[first_tx_dates['transaction_date'].dt.date == latest_date]
-    today_new_customers_breakdown = get_customer_status_breakdown(today_data[today_data['customer_id'].isin(today_new_customers_data['customer_id'])])
+    today_new_customers_breakdown = get_customer_status_breakdown(*windows['today'], exclude=customers_before(windows['today'][0]))
     
-    today_total_amount_breakdown = get_financial_status_breakdown(today_data)
+    today_total_amount_breakdown = format_breakdown(window_totals['today']['amount'], kpi_engine.has_status, currency='€')
     
     # Calculate breakdowns for this month
-    this_month_transactions_breakdown = get_status_breakdown(this_month_data, 'transactions')
-    this_month_customers_breakdown = get_customer_status_breakdown(this_month_data)
+    this_month_transactions_breakdown = format_breakdown(window_totals['this_month']['transactions'], kpi_engine.has_status)
+    this_month_customers_breakdown = get_customer_status_breakdown(*windows['this_month'])
     
     # Calculate new customers for this month (customers whose first transaction was this month)
-    this_month_new_customers_data = first_tx_dates[first_tx_dates['transaction_date'].dt.to_period('M') == pd.Timestamp(latest_date).to_period('M')]
-    this_month_new_customers_breakdown = get_customer_status_breakdown(this_month_data[this_month_data['customer_id'].isin(this_month_new_customers_data['customer_id'])])
+    this_month_new_customers_breakdown = get_customer_status_breakdown(*windows['this_month'], exclude=customers_before(windows['this_month'][0]))
     
-    this_month_total_amount_breakdown = get_financial_status_breakdown(this_month_data)
+    this_month_total_amount_breakdown = format_breakdown(window_totals['this_month']['amount'], kpi_engine.has_status, currency='€')
     
     # Get biggest amount (from completed transactions only)
     today_biggest_amount = today_data[today_data['status'] == 'complete']['amountToSend'].max() if 'amountToSend' in today_data.columns and 'status' in today_data.columns else 0
@@ -323,11 +377,56 @@ if uploaded_file:
                 </div>
             </div>
             """, unsafe_allow_html=True)
-    
+
+    # Rolling windows (clipped to the selected date range)
+    st.markdown("### 📆 Rolling Windows")
+    rolling_windows = [
+        ('last_7_days', "LAST 7 DAYS"),
+        ('last_30_days', "LAST 30 DAYS"),
+        ('quarter_to_date', "QUARTER TO DATE"),
+        ('year_to_date', "YEAR TO DATE"),
+    ]
+    for column, (window_name, window_label) in zip(st.columns(len(rolling_windows)), rolling_windows):
+        window_start, window_end = windows[window_name]
+        window_transactions = format_breakdown(window_totals[window_name]['transactions'], kpi_engine.has_status)
+        window_amount = format_breakdown(window_totals[window_name]['amount'], kpi_engine.has_status, currency='€')
+        with column:
+            st.markdown(f"""
+            <div style="background: linear-gradient(135deg, #f5f7ff 0%, #ffffff 100%); padding: 15px; border-radius: 8px; margin: 8px 0; box-shadow: 0 2px 8px rgba(0,0,0,0.08); border-left: 4px solid #7E57C2;">
+                <h5 style="margin: 0; color: #555; font-size: 14px; font-weight: 600;">🗓️ {window_label}</h5>
+                <p style="margin: 0; color: #666; font-size: 11px;">{window_start.strftime('%b %d, %Y')} – {window_end.strftime('%b %d, %Y')}</p>
+                <h4 style="margin: 6px 0 3px 0; color: #2E7D32; font-size: 15px; font-weight: 700; line-height: 1.3;">🛒 {window_transactions}</h4>
+                <h4 style="margin: 3px 0; color: #F57F17; font-size: 15px; font-weight: 700; line-height: 1.3;">💰 {window_amount}</h4>
+            </div>
+            """, unsafe_allow_html=True)
+
+    if sampling:
+        # 95% confidence intervals of the sampled KPI windows
+        kpi_days = df_filtered['transaction_date'].dt.normalize()
+        def window_ci(window_start, window_end):
+            rows = df_filtered.index[((kpi_days >= pd.Timestamp(window_start)) & (kpi_days <= pd.Timestamp(window_end))).to_numpy()]
+            _, transactions_ci = sample.estimate(rows)
+            _, customers_ci = sample.estimate(rows, distinct=True)
+            amount_ci = 0.0
+            if 'amountToSend' in df_filtered.columns:
+                _, amount_ci = sample.estimate(rows, df_filtered.loc[rows, 'amountToSend'].fillna(0).to_numpy())
+            return f"±{transactions_ci:,.0f} transactions, ±€{amount_ci:,.0f}, ±{customers_ci:,.0f} active customers"
+        ci_windows = [('today', "Today"), ('this_month', "This month")] + [(name, label.title()) for name, label in rolling_windows]
+        st.caption("95% confidence intervals (sampling mode) — " + "; ".join(f"{label}: {window_ci(*windows[name])}" for name, label in ci_windows))
+
     st.markdown("---")
-    
+
     # st.write(df_filtered.head())
 
+    if loading:
+        # Monthly preview from the ingested prefix, then poll until ingestion completes
+        st.markdown(f"### ⏳ Monthly Preview ({job.rows:,} rows loaded so far)")
+        preview_channel = monthly_summary_by_channel(df_filtered).pivot(index='transaction_month', columns='distributionChannel', values='Total Transactions').fillna(0)
+        st.plotly_chart(plot_combined_by_channel(preview_channel, country), use_container_width=True, key="preview_channel_chart")
+        st.plotly_chart(plot_customers_with_new_and_total(monthly_customer_stats(df_filtered), country), use_container_width=True, key="preview_customer_chart")
+        time.sleep(1)
+        st.rerun()
+
     tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8 = st.tabs([
         "Monthly Summary", "Customers", "Cohort Analysis", "Breakdowns", "Cities", "Promo Codes", "RFM Segmentation", "Month Comparison"
     ])
@@ -349,24 +448,17 @@ if uploaded_file:
                     month_data = df_filtered[df_filtered['transaction_month'] == month]
                     
                     # Total transactions for this month
-                    total_transactions = len(month_data)
+                    total_transactions = weighted_rows(month_data)
                     
                     # Status breakdown for this month
-                    status_counts = month_data['status'].value_counts()
-                    
-                    # Handle both spellings
-                    if 'cancelled' in status_counts.index and 'canceled' in status_counts.index:
-                        status_counts['cancelled'] += status_counts['canceled']
-                        status_counts = status_counts.drop('canceled')
-                    elif 'canceled' in status_counts.index:
-                        status_counts = status_counts.rename({'canceled': 'cancelled'})
+                    status_counts = status_counts_of(month_data)
                     
                     completed = status_counts.get('complete', 0)
                     in_progress = status_counts.get('in progress', 0)
                     cancelled = status_counts.get('cancelled', 0)
                     
                     # Channel breakdown for this month
-                    channel_counts = month_data['distributionChannel'].value_counts()
+                    channel_counts = weighted_counts(month_data, 'distributionChannel')
                     
                     # More flexible channel matching
                     cash_pickup_count = 0
@@ -386,18 +478,18 @@ if uploaded_file:
                             cash_pickup_count += count
                             # Get status breakdown for cash pickup
                             cash_pickup_data = month_data[month_data['distributionChannel'] == channel]
-                            cash_status_counts = cash_pickup_data['status'].value_counts()
+                            cash_status_counts = status_counts_of(cash_pickup_data)
                             cash_pickup_completed += cash_status_counts.get('complete', 0)
                             cash_pickup_in_progress += cash_status_counts.get('in progress', 0)
-                            cash_pickup_cancelled += cash_status_counts.get('cancelled', 0) + cash_status_counts.get('canceled', 0)
+                            cash_pickup_cancelled += cash_status_counts.get('cancelled', 0)
                         elif 'bank' in channel_lower or 'transfer' in channel_lower or 'account' in channel_lower:
                             bank_transfer_count += count
                             # Get status breakdown for bank transfer
                             bank_transfer_data = month_data[month_data['distributionChannel'] == channel]
-                            bank_status_counts = bank_transfer_data['status'].value_counts()
+                            bank_status_counts = status_counts_of(bank_transfer_data)
                             bank_transfer_completed += bank_status_counts.get('complete', 0)
                             bank_transfer_in_progress += bank_status_counts.get('in progress', 0)
-                            bank_transfer_cancelled += bank_status_counts.get('cancelled', 0) + bank_status_counts.get('canceled', 0)
+                            bank_transfer_cancelled += bank_status_counts.get('cancelled', 0)
                     
                     monthly_transaction_stats_with_status.append({
                         'Month': month.strftime('%B %Y'),
@@ -421,31 +513,20 @@ if uploaded_file:
                 st.dataframe(summary_df, hide_index=True, use_container_width=True)
                 
                 st.markdown("**📊 Transactions by Status (Stacked Bar)**")
-                status_monthly = df_filtered.groupby(['transaction_month', 'status']).size().reset_index(name='Total Transactions')
+                status_monthly = weighted_counts(df_filtered, ['transaction_month', 'status']).reset_index(name='Total Transactions')
                 # Handle both spellings of cancelled
                 status_monthly['status'] = status_monthly['status'].replace({'canceled': 'cancelled'})
-                import plotly.express as px
-                fig_status = px.bar(
-                    status_monthly,
-                    x='transaction_month',
-                    y='Total Transactions',
-                    color='status',
-                    barmode='stack',
-                    title="Monthly Transactions by Status (Stacked Bar)"
-                )
-                fig_status.update_layout(
-                    xaxis_title="Month",
-                    yaxis_title="Number of Transactions",
-                    hovermode='x unified'
-                )
+                fig_status = plot_status_bar(status_monthly, 'Total Transactions', "Monthly Transactions by Status (Stacked Bar)", "Number of Transactions")
                 st.plotly_chart(fig_status, use_container_width=True, key="monthly_status_chart")
             
             # Original channel breakdown
             st.markdown("**📊 Transactions by Distribution Channel**")
-            grouped = monthly_summary_by_channel(df_filtered)
-            pivoted = grouped.pivot(index='transaction_month', columns='distributionChannel', values='Total Transactions').fillna(0)
-            fig = plot_combined_by_channel(pivoted, country)
-            st.plotly_chart(fig, use_container_width=True, key="monthly_channel_chart")
+            monthly = wait_for_artifact('monthly', "monthly summaries")
+            if monthly is not None:
+                grouped = monthly[0]
+                pivoted = grouped.pivot(index='transaction_month', columns='distributionChannel', values='Total Transactions').fillna(0)
+                fig = plot_combined_by_channel(pivoted, country)
+                st.plotly_chart(fig, use_container_width=True, key="monthly_channel_chart")
         else:
             # Day view: let user pick a day within the filtered range
             min_day = df_filtered['transaction_date'].min().date()
@@ -456,13 +537,7 @@ if uploaded_file:
                 # Status breakdown for the day (pie chart)
                 if 'status' in day_df.columns:
                     st.markdown(f"**📊 Status Breakdown for {selected_day} (Pie Chart)**")
-                    status_counts = day_df['status'].value_counts()
-                    # Handle both spellings
-                    if 'cancelled' in status_counts.index and 'canceled' in status_counts.index:
-                        status_counts['cancelled'] += status_counts['canceled']
-                        status_counts = status_counts.drop('canceled')
-                    elif 'canceled' in status_counts.index:
-                        status_counts = status_counts.rename({'canceled': 'cancelled'})
+                    status_counts = status_counts_of(day_df)
                     
                     import plotly.express as px
                     fig_status = px.pie(values=status_counts.values, names=status_counts.index, title=f"Transaction Status for {selected_day}")
@@ -470,7 +545,7 @@ if uploaded_file:
                 
                 # Channel breakdown for the day (pie chart)
                 st.markdown(f"**📊 Channel Breakdown for {selected_day} (Pie Chart)**")
-                channel_counts = day_df['distributionChannel'].value_counts()
+                channel_counts = weighted_counts(day_df, 'distributionChannel')
                 import plotly.express as px
                 fig_channel = px.pie(values=channel_counts.values, names=channel_counts.index, title=f"Transactions by Channel for {selected_day}")
                 st.plotly_chart(fig_channel, use_container_width=True, key="daily_channel_chart")
@@ -479,7 +554,7 @@ if uploaded_file:
                 st.markdown(f"**📊 Transaction Summary for {selected_day}**")
                 
                 # Show total transactions first
-                total_transactions = len(day_df)
+                total_transactions = weighted_rows(day_df)
                 st.markdown(f"**Total Transactions: {total_transactions}**")
                 st.markdown("---")
                 
@@ -499,18 +574,18 @@ if uploaded_file:
                         cash_pickup_total += count
                         # Get status breakdown for cash pickup
                         cash_pickup_data = day_df[day_df['distributionChannel'] == channel]
-                        cash_status_counts = cash_pickup_data['status'].value_counts()
+                        cash_status_counts = status_counts_of(cash_pickup_data)
                         cash_pickup_completed += cash_status_counts.get('complete', 0)
                         cash_pickup_in_progress += cash_status_counts.get('in progress', 0)
-                        cash_pickup_cancelled += cash_status_counts.get('cancelled', 0) + cash_status_counts.get('canceled', 0)
+                        cash_pickup_cancelled += cash_status_counts.get('cancelled', 0)
                     elif 'bank' in channel_lower or 'transfer' in channel_lower or 'account' in channel_lower:
                         bank_account_total += count
                         # Get status breakdown for bank account
                         bank_account_data = day_df[day_df['distributionChannel'] == channel]
-                        bank_status_counts = bank_account_data['status'].value_counts()
+                        bank_status_counts = status_counts_of(bank_account_data)
                         bank_account_completed += bank_status_counts.get('complete', 0)
                         bank_account_in_progress += bank_status_counts.get('in progress', 0)
-                        bank_account_cancelled += bank_status_counts.get('cancelled', 0) + bank_status_counts.get('canceled', 0)
+                        bank_account_cancelled += bank_status_counts.get('cancelled', 0)
                 
                 # Display in clean format
                 col1, col2 = st.columns(2)
@@ -540,74 +615,57 @@ if uploaded_file:
             # Status breakdown for customers (stacked bar)
             if 'status' in df_filtered.columns:
                 st.markdown("**📊 Monthly Customer Summary Table**")
+                customers = wait_for_artifact('customers', "customer table")
+                if customers is not None:
+                    # Calculate monthly customer stats with status breakdown
+                    monthly_customer_stats_with_status = []
+                    new_by_month = weighted_counts(customers.assign(first_month=customers['first_transaction'].dt.to_period('M')), 'first_month')
+                    months = sorted(df_filtered['transaction_month'].unique(), reverse=True)
                 
-                # Calculate monthly customer stats with status breakdown
-                monthly_customer_stats_with_status = []
-                months = sorted(df_filtered['transaction_month'].unique(), reverse=True)
-                
-                for month in months:
-                    month_data = df_filtered[df_filtered['transaction_month'] == month]
+                    for month in months:
+                        month_data = df_filtered[df_filtered['transaction_month'] == month]
                     
-                    # Total unique customers for this month
-                    total_customers = month_data['customer_id'].nunique()
+                        # Total unique customers for this month
+                        total_customers = weighted_rows(month_data, 'customer_id')
                     
-                    # Get the most common status for each customer in this month
-                    customer_status = month_data.groupby('customer_id')['status'].agg(lambda x: x.mode()[0] if len(x.mode()) > 0 else x.iloc[0]).reset_index()
-                    status_counts = customer_status['status'].value_counts()
+                        # Get the most common status for each customer in this month
+                        customer_status = month_data.groupby('customer_id')['status'].agg(lambda x: x.mode()[0] if len(x.mode()) > 0 else x.iloc[0]).reset_index()
+                        status_counts = status_counts_of(with_customer_weights(customer_status, month_data))
                     
-                    # Handle both spellings
-                    if 'cancelled' in status_counts.index and 'canceled' in status_counts.index:
-                        status_counts['cancelled'] += status_counts['canceled']
-                        status_counts = status_counts.drop('canceled')
-                    elif 'canceled' in status_counts.index:
-                        status_counts = status_counts.rename({'canceled': 'cancelled'})
-                    
-                    completed = status_counts.get('complete', 0)
-                    in_progress = status_counts.get('in progress', 0)
-                    cancelled = status_counts.get('cancelled', 0)
+                        completed = status_counts.get('complete', 0)
+                        in_progress = status_counts.get('in progress', 0)
+                        cancelled = status_counts.get('cancelled', 0)
                     
-                    # New customers for this month
-                    first_tx_dates = df_filtered.groupby('customer_id')['transaction_date'].min().reset_index()
-                    new_customers = (first_tx_dates['transaction_date'].dt.to_period('M') == month.to_period('M')).sum()
+                        # New customers for this month
+                        new_customers = new_by_month.get(month.to_period('M'), 0)
                     
-                    monthly_customer_stats_with_status.append({
-                        'Month': month.strftime('%B %Y'),
-                        'Total Customers': total_customers,
-                        'Completed': completed,
-                        'In Progress': in_progress,
-                        'Cancelled': cancelled,
-                        'New Customers': new_customers
-                    })
+                        monthly_customer_stats_with_status.append({
+                            'Month': month.strftime('%B %Y'),
+                            'Total Customers': total_customers,
+                            'Completed': completed,
+                            'In Progress': in_progress,
+                            'Cancelled': cancelled,
+                            'New Customers': new_customers
+                        })
                 
-                # Create and display the table
-                import pandas as pd
-                summary_df = pd.DataFrame(monthly_customer_stats_with_status)
-                st.dataframe(summary_df, hide_index=True, use_container_width=True)
+                    # Create and display the table
+                    import pandas as pd
+                    summary_df = pd.DataFrame(monthly_customer_stats_with_status)
+                    st.dataframe(summary_df, hide_index=True, use_container_width=True)
                 
                 st.markdown("**📊 Customers by Status (Stacked Bar)**")
-                customer_status_monthly = df_filtered.groupby(['transaction_month', 'status'])['customer_id'].nunique().reset_index(name='Unique Customers')
+                customer_status_monthly = weighted_counts(df_filtered, ['transaction_month', 'status'], 'customer_id').reset_index(name='Unique Customers')
                 customer_status_monthly['status'] = customer_status_monthly['status'].replace({'canceled': 'cancelled'})
-                import plotly.express as px
-                fig_customer_status = px.bar(
-                    customer_status_monthly,
-                    x='transaction_month',
-                    y='Unique Customers',
-                    color='status',
-                    barmode='stack',
-                    title="Monthly Unique Customers by Status (Stacked Bar)"
-                )
-                fig_customer_status.update_layout(
-                    xaxis_title="Month",
-                    yaxis_title="Number of Unique Customers",
-                    hovermode='x unified'
-                )
+                fig_customer_status = plot_status_bar(customer_status_monthly, 'Unique Customers', "Monthly Unique Customers by Status (Stacked Bar)", "Number of Unique Customers")
                 st.plotly_chart(fig_customer_status, use_container_width=True, key="monthly_customer_status_chart")
             
             # Original customer stats
             st.markdown("**📊 Customer Statistics**")
-            combined = monthly_customer_stats(df_filtered)
-            fig = plot_customers_with_new_and_total(combined, country)
-            st.plotly_chart(fig, use_container_width=True, key="monthly_customer_stats_chart")
+            monthly = wait_for_artifact('monthly', "monthly summaries")
+            if monthly is not None:
+                combined = monthly[1]
+                fig = plot_customers_with_new_and_total(combined, country)
+                st.plotly_chart(fig, use_container_width=True, key="monthly_customer_stats_chart")
         else:
             min_day = df_filtered['transaction_date'].min().date()
             max_day = df_filtered['transaction_date'].max().date()
@@ -617,23 +675,16 @@ if uploaded_file:
                 # Status breakdown for the day (pie chart)
                 if 'status' in day_df.columns:
                     st.markdown(f"**📊 Customer Status for {selected_day} (Pie Chart)**")
-                    customer_status_counts = day_df.groupby('status')['customer_id'].nunique()
-                    # Handle both spellings
-                    if 'cancelled' in customer_status_counts.index and 'canceled' in customer_status_counts.index:
-                        customer_status_counts['cancelled'] += customer_status_counts['canceled']
-                        customer_status_counts = customer_status_counts.drop('canceled')
-                    elif 'canceled' in customer_status_counts.index:
-                        customer_status_counts = customer_status_counts.rename({'canceled': 'cancelled'})
+                    customer_status_counts = status_counts_of(day_df, 'customer_id')
                     
                     import plotly.express as px
                     fig_customer_status = px.pie(values=customer_status_counts.values, names=customer_status_counts.index, title=f"Customer Status for {selected_day}")
                     st.plotly_chart(fig_customer_status, use_container_width=True, key="daily_customer_status_chart")
                 
                 # Active customers for the day
-                active_customers = day_df['customer_id'].nunique()
+                active_customers = customer_index.distinct(selected_day, selected_day, selected_country)
                 # New customers for the day (first-ever transaction on this day)
-                first_tx_dates = df_filtered.groupby('customer_id')['transaction_date'].min().reset_index()
-                new_customers = (first_tx_dates['transaction_date'].dt.date == selected_day).sum()
+                new_customers = customer_index.distinct(selected_day, selected_day, selected_country, exclude=customers_before(selected_day))
                 
                 # Calculate status breakdown for active customers
                 if 'status' in day_df.columns:
@@ -642,14 +693,7 @@ if uploaded_file:
                     customer_status = day_df.groupby('customer_id')['status'].agg(lambda x: x.mode()[0] if len(x.mode()) > 0 else x.iloc[0]).reset_index()
                     
                     # Count customers by their most common status
-                    status_counts = customer_status['status'].value_counts()
-                    
-                    # Handle both spellings
-                    if 'cancelled' in status_counts.index and 'canceled' in status_counts.index:
-                        status_counts['cancelled'] += status_counts['canceled']
-                        status_counts = status_counts.drop('canceled')
-                    elif 'canceled' in status_counts.index:
-                        status_counts = status_counts.rename({'canceled': 'cancelled'})
+                    status_counts = status_counts_of(with_customer_weights(customer_status, day_df))
                     
                     completed_active = status_counts.get('complete', 0)
                     in_progress_active = status_counts.get('in progress', 0)
@@ -661,26 +705,17 @@ if uploaded_file:
                 # Calculate status breakdown for new customers
                 if 'status' in day_df.columns:
                     # Get only the customers who are actually new (first transaction on this day)
-                    new_customer_ids = first_tx_dates[first_tx_dates['transaction_date'].dt.date == selected_day]['customer_id'].tolist()
+                    first_tx_dates = entry.index(('customers',) + filter_key, lambda: customer_table(df_filtered), evictable=True)
+                    new_customer_ids = first_tx_dates[first_tx_dates['first_transaction'].dt.date == selected_day]['customer_id'].tolist()
                     new_customers_data = day_df[day_df['customer_id'].isin(new_customer_ids)]
                     
                     # For new customers, we need to count each customer only once, not multiple transactions
-                    # Get the status of each new customer's first transaction on this day
-                    new_customers_status = []
-                    for customer_id in new_customer_ids:
-                        customer_transactions = new_customers_data[new_customers_data['customer_id'] == customer_id]
-                        if not customer_transactions.empty:
-                            # Take the first transaction's status for this customer
-                            first_status = customer_transactions.iloc[0]['status']
-                            new_customers_status.append(first_status)
-                    
-                    # Count the statuses
-                    from collections import Counter
-                    status_counter = Counter(new_customers_status)
+                    # Take the status of each new customer's first transaction on this day
+                    status_counter = status_counts_of(new_customers_data.drop_duplicates('customer_id'))
                     
                     completed_new = status_counter.get('complete', 0)
                     in_progress_new = status_counter.get('in progress', 0)
-                    cancelled_new = status_counter.get('cancelled', 0) + status_counter.get('canceled', 0)
+                    cancelled_new = status_counter.get('cancelled', 0)
                     new_breakdown = f"({completed_new} completed, {in_progress_new} in progress, {cancelled_new} cancelled)"
                 else:
                     new_breakdown = ""
@@ -692,12 +727,21 @@ if uploaded_file:
 
     with tab3:
         st.subheader("Cohort Analysis")
-        retention, cohort_labels = run_cohort_analysis(df_filtered)
-        st.write("Retention Table:")
-        # st.dataframe(retention)
-        st.write("Cohort Sizes:")
-        st.write(cohort_labels)
-        st.pyplot(plot_cohort_heatmap(retention, cohort_labels, country))
+        cohort_granularity = st.radio("Cohort granularity", list(GRANULARITIES), format_func=GRANULARITIES.get, horizontal=True, key="cohort_granularity")
+        cohort_metric = st.radio("Retention of", list(METRICS), format_func=METRICS.get, horizontal=True, key="cohort_metric")
+        if cohort_granularity == 'M':
+            # Monthly cohorts are warmed up in the background; finer ones are built on demand
+            cohort_engine = wait_for_artifact('cohort', "cohort analysis")
+        else:
+            cohort_engine = entry.index(('cohort', cohort_granularity) + filter_key, lambda: CohortEngine(df_filtered, cohort_granularity), evictable=True)
+        if cohort_engine is not None:
+            retention, cohort_labels = cohort_engine.retention(cohort_metric)
+            st.write("Retention Table:")
+            # st.dataframe(retention)
+            st.write("Cohort Sizes:")
+            st.write(cohort_labels)
+            if not retention.empty:
+                st.plotly_chart(plot_cohort_heatmap(retention, cohort_labels, country, GRANULARITIES[cohort_granularity], METRICS[cohort_metric]), use_container_width=True, key="cohort_heatmap_chart")
 
     with tab4:
         st.subheader("Country, Network, Reason, Governorate Breakdown")
@@ -706,76 +750,74 @@ if uploaded_file:
         if 'transaction_month' in df_filtered.columns:
             months = sorted(df_filtered['transaction_month'].dt.to_period('M').unique())
             month_options += [str(m) for m in months]
+        def get_period_data(selected_period):
+            if selected_period == "All period":
+                return df_filtered
+            period = pd.Period(selected_period)
+            return df_filtered[df_filtered['transaction_month'].dt.to_period('M') == period]
+        # Each pie gets its own period selector and a placeholder; all pies are then grouped in one top-N call
+        breakdown_pies = []
+        # Reason/network/governorate pies merge the dataset's per-month heavy-hitter sketches over the period
+        sketches = entry.index(('sketches',), lambda: SketchIndex(df))
+        sketch_pies = {}
+        def add_sketch_pie(pie_key, column, selected_period, title):
+            period_start, period_end = start_date, end_date
+            if selected_period != "All period":
+                period = pd.Period(selected_period)
+                period_start, period_end = max(start_date, period.start_time.date()), min(end_date, period.end_time.date())
+            pie_df, bounds = sketches.top_with_other(column, period_start, period_end, selected_country, df_filtered, k=10)
+            sketch_pies[pie_key] = (pie_df, bounds)
+            breakdown_pies.append((pie_key, None, title, st.container()))
         # Pie: Transactions by country
         selected_month_country = st.selectbox("Select period for Country breakdown", options=month_options, key='country_period')
-        if selected_month_country == "All period":
-            df_period = df_filtered
-        else:
-            period = pd.Period(selected_month_country)
-            df_period = df_filtered[df_filtered['transaction_month'].dt.to_period('M') == period]
-        tx_counts = df_period['country'].value_counts().reset_index()
-        tx_counts.columns = ['Country', 'Total Transactions']
-        st.plotly_chart(plot_pie(tx_counts['Country'], tx_counts['Total Transactions'], f'Total Transactions by Country'), use_container_width=True, key="country_tx_chart")
+        breakdown_pies.append(('country_tx', weighted_counts(get_period_data(selected_month_country), 'country'), 'Total Transactions by Country', st.container()))
         # Pie: Unique customers by country
         selected_month_customers = st.selectbox("Select period for Unique Customers breakdown", options=month_options, key='customers_period')
-        if selected_month_customers == "All period":
-            df_period = df_filtered
-        else:
-            period = pd.Period(selected_month_customers)
-            df_period = df_filtered[df_filtered['transaction_month'].dt.to_period('M') == period]
-        unique_customers = df_period.groupby('country')['customer_id'].nunique().reset_index()
-        unique_customers.columns = ['Country', 'Unique Customers']
-        st.plotly_chart(plot_pie(unique_customers['Country'], unique_customers['Unique Customers'], 'Unique Customers by Country'), use_container_width=True, key="country_cust_chart")
+        breakdown_pies.append(('country_cust', weighted_counts(get_period_data(selected_month_customers), 'country', 'customer_id'), 'Unique Customers by Country', st.container()))
         # Pie: Reason (if exists)
         if 'reason' in df_filtered.columns:
             selected_month_reason = st.selectbox("Select period for Reason breakdown", options=month_options, key='reason_period')
-            if selected_month_reason == "All period":
-                df_period = df_filtered
-            else:
-                period = pd.Period(selected_month_reason)
-                df_period = df_filtered[df_filtered['transaction_month'].dt.to_period('M') == period]
-            reason_counts = df_period['reason'].value_counts().reset_index()
-            reason_counts.columns = ['Reason', 'Transaction Count']
-            st.plotly_chart(plot_pie(reason_counts['Reason'], reason_counts['Transaction Count'], f"Reasons for Money Transfers"), use_container_width=True, key="reason_chart")
+            add_sketch_pie('reason', 'reason', selected_month_reason, "Reasons for Money Transfers")
         # Pie: Network (if exists)
         if 'network' in df_filtered.columns:
             selected_month_network = st.selectbox("Select period for Network breakdown", options=month_options, key='network_period')
-            if selected_month_network == "All period":
-                df_period = df_filtered
-            else:
-                period = pd.Period(selected_month_network)
-                df_period = df_filtered[df_filtered['transaction_month'].dt.to_period('M') == period]
-            network_counts = df_period['network'].str.strip().str.title().value_counts().reset_index()
-            network_counts.columns = ['Network', 'Transaction Count']
-            st.plotly_chart(plot_pie(network_counts['Network'], network_counts['Transaction Count'], f'Network Usage'), use_container_width=True, key="network_chart")
+            add_sketch_pie('network', 'network', selected_month_network, 'Network Usage')
         # Pie: Governorate (if exists)
         if 'gov' in df_filtered.columns:
             selected_month_gov = st.selectbox("Select period for Governorate breakdown", options=month_options, key='gov_period')
-            if selected_month_gov == "All period":
-                df_period = df_filtered
+            add_sketch_pie('gov', 'gov', selected_month_gov, 'Transaction Distribution by Governorate')
+        breakdown_long = pd.concat(
+            [counts.rename_axis('label').reset_index(name='value').assign(pie=pie_key) for pie_key, counts, _, _ in breakdown_pies if counts is not None],
+            ignore_index=True
+        )
+        breakdown_data, _ = group_top_n_with_other_batch(breakdown_long, 'pie', 'value', label_col='label', top_n=10)
+        breakdown_groups = dict(tuple(breakdown_data.groupby('pie', sort=False)))
+        for pie_key, _, title, container in breakdown_pies:
+            if pie_key in sketch_pies:
+                pie_df, bounds = sketch_pies[pie_key]
             else:
-                period = pd.Period(selected_month_gov)
-                df_period = df_filtered[df_filtered['transaction_month'].dt.to_period('M') == period]
-            gov_counts = df_period['gov'].value_counts().reset_index()
-            gov_counts.columns = ['Governorate', 'Transaction Count']
-            st.plotly_chart(plot_pie(gov_counts['Governorate'], gov_counts['Transaction Count'], f'Transaction Distribution by Governorate'), use_container_width=True, key="gov_chart")
+                pie_df, bounds = breakdown_groups.get(pie_key, breakdown_data.iloc[:0]), None
+            container.plotly_chart(plot_pie(pie_df['label'], pie_df['value'], title), use_container_width=True, key=f"{pie_key}_chart")
+            if bounds:
+                container.caption(bounds)
 
     with tab5:
         st.subheader("Cities Analysis")
         if 'gov' in df_filtered.columns and 'ville' in df_filtered.columns:
-            govs = sorted(df_filtered['gov'].dropna().unique())
+            # Hierarchy index, built once per dataset and country: dropdown options and per-city
+            # series without scanning the frame; a date range slices it
+            geo_all = entry.index(('geo', selected_country), lambda: GeoHierarchy(df if selected_country is None else df[df['country'] == selected_country]))
+            geo = entry.index(('geo_window',) + filter_key, lambda: geo_all.window(start_date, end_date, df_filtered), evictable=True)
+            govs = geo.govs()
             selected_gov = st.selectbox("Select Governorate", options=govs)
-            villes = sorted(df_filtered[df_filtered['gov'] == selected_gov]['ville'].dropna().unique())
+            villes = geo.villes(selected_gov)
             selected_ville = st.selectbox("Select City", options=villes)
-            city_df = df_filtered[(df_filtered['gov'] == selected_gov) & (df_filtered['ville'] == selected_ville)]
+            city_daily = geo.daily(selected_gov, selected_ville)
             # Add view by option
             view_by = st.radio("View by", ["Month", "Day"], horizontal=True, key="city_view_by")
-            if not city_df.empty:
+            if not city_daily.empty:
                 if view_by == "Month":
-                    monthly = city_df.groupby(city_df['transaction_month']).agg(
-                        Transactions=('customer_id', 'count'),
-                        Active_Customers=('customer_id', 'nunique')
-                    ).reset_index()
+                    monthly = geo.monthly(selected_gov, selected_ville)
                     import plotly.express as px
                     fig1 = px.line(monthly, x='transaction_month', y='Transactions', title=f"Transactions Over Time - {selected_ville}")
                     fig2 = px.line(monthly, x='transaction_month', y='Active_Customers', title=f"Active Customers Over Time - {selected_ville}")
@@ -783,13 +825,13 @@ if uploaded_file:
                     st.plotly_chart(fig2, use_container_width=True, key="city_cust_chart")
                 else:
                     # Day view
-                    min_day = city_df['transaction_date'].min().date()
-                    max_day = city_df['transaction_date'].max().date()
+                    min_day = city_daily.index.min().date()
+                    max_day = city_daily.index.max().date()
                     selected_day = st.date_input("Select day", min_value=min_day, max_value=max_day, value=max_day, key="city_day")
-                    day_df = city_df[city_df['transaction_date'].dt.date == selected_day]
-                    if not day_df.empty:
-                        transactions = day_df.shape[0]
-                        active_customers = day_df['customer_id'].nunique()
+                    if pd.Timestamp(selected_day) in city_daily.index:
+                        day_stats = city_daily.loc[pd.Timestamp(selected_day)]
+                        transactions = int(day_stats['Transactions'])
+                        active_customers = int(day_stats['Active_Customers'])
                         st.metric("Transactions", transactions)
                         st.metric("Active Customers", active_customers)
                         # Optionally, plot a bar
@@ -803,19 +845,10 @@ if uploaded_file:
                     else:
                         st.info("No data for this city on the selected day.")
                 # Withdrawal points breakdown with period selector
-                if 'network' in city_df.columns:
-                    month_options = ["All period"]
-                    if 'transaction_month' in city_df.columns:
-                        months = sorted(city_df['transaction_month'].dt.to_period('M').unique())
-                        month_options += [str(m) for m in months]
+                if 'network' in df_filtered.columns:
+                    month_options = ["All period"] + geo.months(selected_gov, selected_ville)
                     selected_month_network_city = st.selectbox("Select period for Withdrawal Points", options=month_options, key='city_network_period')
-                    if selected_month_network_city == "All period":
-                        city_period_df = city_df
-                    else:
-                        period = pd.Period(selected_month_network_city)
-                        city_period_df = city_df[city_df['transaction_month'].dt.to_period('M') == period]
-                    network_counts = city_period_df['network'].str.strip().str.title().value_counts().reset_index()
-                    network_counts.columns = ['Network', 'Transaction Count']
+                    network_counts = geo.network(selected_gov, selected_ville, None if selected_month_network_city == "All period" else selected_month_network_city)
                     st.plotly_chart(plot_pie(network_counts['Network'], network_counts['Transaction Count'], f'Withdrawal Points in {selected_ville}'), use_container_width=True, key="city_network_chart")
             else:
                 st.info("No data for this city.")
@@ -825,14 +858,14 @@ if uploaded_file:
     with tab6:
         st.subheader("Promo Codes Analysis")
         if 'promoCode' in df_filtered.columns:
-            promo_valid = df_filtered[df_filtered['promoCode'].notna() & (df_filtered['promoCode'].str.strip() != '')].copy()
-            if not promo_valid.empty:
-                promo_valid['promoCode_clean'] = promo_valid['promoCode'].str.strip().str.lower()
-                promo_counts = promo_valid['promoCode_clean'].value_counts().reset_index()
-                promo_counts.columns = ['Promo Code', 'Usage Count']
-                st.write("Promo Code Usage:")
-                st.dataframe(promo_counts, hide_index=True)
-                st.plotly_chart(plot_pie(promo_counts['Promo Code'], promo_counts['Usage Count'], f"Promo Code Usage - {country}"), use_container_width=True, key="promo_chart")
+            promo_stats = entry.index(('promo', selected_country, start_date, end_date), lambda: promo_analytics(df_filtered), evictable=True)
+            if not promo_stats.empty:
+                st.write("Promo Code Performance:")
+                st.dataframe(promo_stats, hide_index=True, use_container_width=True)
+                sketches = entry.index(('sketches',), lambda: SketchIndex(df))
+                promo_counts, promo_bounds = sketches.top_with_other('promoCode', start_date, end_date, selected_country, df_filtered, k=10)
+                st.plotly_chart(plot_pie(promo_counts['label'], promo_counts['value'], f"Promo Code Usage - {country}"), use_container_width=True, key="promo_chart")
+                st.caption(promo_bounds)
             else:
                 st.info("No valid promo codes found.")
         else:
@@ -841,61 +874,34 @@ if uploaded_file:
     with tab7:
         st.subheader("RFM Segmentation")
         import plotly.express as px
-        # Reference date: day after last transaction
-        reference_date = df_filtered['transaction_date'].max() + pd.Timedelta(days=1)
-        # Calculate RFM
-        rfm = df_filtered.groupby('customer_id').agg({
-            'transaction_date': lambda x: (reference_date - x.max()).days,  # Recency
-            '_id': 'count',                                                 # Frequency
-            'amountToSend': 'sum'                                           # Monetary
-        }).reset_index()
-        rfm.columns = ['customer_id', 'recency', 'frequency', 'monetary']
-        rfm['R_score'] = pd.qcut(rfm['recency'], 5, labels=[5, 4, 3, 2, 1]).astype(int)
-        rfm['F_score'] = pd.qcut(rfm['frequency'].rank(method='first'), 5, labels=[1, 2, 3, 4, 5]).astype(int)
-        rfm['M_score'] = pd.qcut(rfm['monetary'], 5, labels=[1, 2, 3, 4, 5]).astype(int)
-        rfm['RFM_score'] = rfm['R_score'].astype(str) + rfm['F_score'].astype(str) + rfm['M_score'].astype(str)
-        # Segment function
-        def refined_segment(row):
-            if row['R_score'] >= 4 and row['F_score'] >= 4 and row['M_score'] >= 4:
-                return 'Champions'
-            elif row['F_score'] >= 4 and row['R_score'] >= 3:
-                return 'Loyal'
-            elif row['R_score'] >= 4:
-                return 'Recent'
-            elif row['F_score'] >= 4:
-                return 'Frequent'
-            elif row['M_score'] >= 4:
-                return 'Big Spenders'
-            elif row['R_score'] <= 2 and row['F_score'] <= 2:
-                return 'Dormant'
-            else:
-                return 'Others'
-        rfm['segment'] = rfm.apply(refined_segment, axis=1)
-        st.write("RFM Table (first 10 rows):")
-        st.dataframe(rfm.head(10), hide_index=True)
-        # Prepare data for Plotly
-        segment_counts = rfm['segment'].value_counts().reset_index()
-        segment_counts.columns = ['segment', 'count']
-        fig = px.bar(
-            segment_counts,
-            x='segment',
-            y='count',
-            labels={'segment': 'Segment', 'count': 'Number of Customers'},
-            title='Customer Distribution by RFM Segment',
-            color='segment',
-            text='count'
-        )
-        fig.update_traces(texttemplate='%{text}', textposition='outside')
-        fig.update_layout(xaxis_title='Segment', yaxis_title='Number of Customers')
-        st.plotly_chart(fig, use_container_width=True, key="rfm_chart")
-        # Download button for RFM CSV
-        csv = rfm.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="Download RFM Analysis as CSV",
-            data=csv,
-            file_name='rfm_analysis.csv',
-            mime='text/csv'
-        )
+        rfm = wait_for_artifact('rfm', "RFM scores")
+        if rfm is not None:
+            st.write("RFM Table (first 10 rows):")
+            st.dataframe(rfm.head(10), hide_index=True)
+            # Prepare data for Plotly
+            # Sum each sampled customer's weight, so oversampled small strata do not skew the segments
+            segment_counts = weighted_counts(rfm, 'segment').sort_values(ascending=False, kind='stable').reset_index()
+            segment_counts.columns = ['segment', 'count']
+            fig = px.bar(
+                segment_counts,
+                x='segment',
+                y='count',
+                labels={'segment': 'Segment', 'count': 'Number of Customers'},
+                title='Customer Distribution by RFM Segment',
+                color='segment',
+                text='count'
+            )
+            fig.update_traces(texttemplate='%{text}', textposition='outside')
+            fig.update_layout(xaxis_title='Segment', yaxis_title='Number of Customers')
+            st.plotly_chart(fig, use_container_width=True, key="rfm_chart")
+            # Download button for RFM CSV
+            csv = rfm.to_csv(index=False).encode('utf-8')
+            st.download_button(
+                label="Download RFM Analysis as CSV",
+                data=csv,
+                file_name='rfm_analysis.csv',
+                mime='text/csv'
+            )
         st.markdown("""
 #### RFM Segments – Understanding the Scores and Categories
 
@@ -951,38 +957,56 @@ Each customer receives a score from 1 (lowest) to 5 (highest) for each metric, b
     with tab8:
         st.subheader("Month Comparison")
         if 'transaction_month' in df_filtered.columns and 'ville' in df_filtered.columns:
-            months = sorted(df_filtered['transaction_month'].dt.to_period('M').unique())
-            month_options = [str(m) for m in months]
-            col1, col2 = st.columns(2)
-            with col1:
-                selected_month1 = st.selectbox("Select First Month", options=month_options, key='month1')
-            with col2:
-                selected_month2 = st.selectbox("Select Second Month", options=month_options, key='month2')
-            # Prepare data for both months
-            def get_month_data(month_str):
-                period = pd.Period(month_str)
-                month_df = df_filtered[df_filtered['transaction_month'].dt.to_period('M') == period]
-                by_city = month_df.groupby('ville').agg(
-                    Transactions=('customer_id', 'count'),
-                    Unique_Customers=('customer_id', 'nunique')
-                ).reset_index()
-                return by_city
-            data1 = get_month_data(selected_month1)
-            data2 = get_month_data(selected_month2)
-            from src.utils import group_top_n_with_other
-            c1, c2 = st.columns(2)
-            with c1:
-                st.write(f"**{selected_month1}**")
-                city_data1_tx, _ = group_top_n_with_other(data1[['ville', 'Transactions']].copy(), 'Transactions', top_n=8)
-                city_data1_cust, _ = group_top_n_with_other(data1[['ville', 'Unique_Customers']].copy(), 'Unique_Customers', top_n=8)
-                st.plotly_chart(plot_pie(city_data1_tx['ville'], city_data1_tx['Transactions'], f"Transactions by City - {selected_month1}"), use_container_width=True, key="month1_tx")
-                st.plotly_chart(plot_pie(city_data1_cust['ville'], city_data1_cust['Unique_Customers'], f"Unique Customers by City - {selected_month1}"), use_container_width=True, key="month1_cust")
-            with c2:
-                st.write(f"**{selected_month2}**")
-                city_data2_tx, _ = group_top_n_with_other(data2[['ville', 'Transactions']].copy(), 'Transactions', top_n=8)
-                city_data2_cust, _ = group_top_n_with_other(data2[['ville', 'Unique_Customers']].copy(), 'Unique_Customers', top_n=8)
-                st.plotly_chart(plot_pie(city_data2_tx['ville'], city_data2_tx['Transactions'], f"Transactions by City - {selected_month2}"), use_container_width=True, key="month2_tx")
-                st.plotly_chart(plot_pie(city_data2_cust['ville'], city_data2_cust['Unique_Customers'], f"Unique Customers by City - {selected_month2}"), use_container_width=True, key="month2_cust")
+            # City x month matrix is built once per dataset and country; a date range slices its
+            # months (recounting partial boundary months), and switching months only reads columns
+            city_month_all = entry.index(('city_month', selected_country), lambda: CityMonthMatrix(df if selected_country is None else df[df['country'] == selected_country]))
+            city_month = entry.index(
+                ('city_month_window',) + filter_key,
+                lambda: city_month_all.window(start_date, end_date, df_filtered),
+                evictable=True
+            )
+            month_options = city_month.month_labels()
+            compare_mode = st.radio("Compare", ["Selected months", "Month-over-month deltas"], horizontal=True, key='month_compare_mode')
+            if compare_mode == "Selected months":
+                selected_months = st.multiselect("Select months", options=month_options, default=month_options[-2:], key='compare_months')
+                metric_labels = {'Transactions': "Transactions", 'Unique_Customers': "Unique Customers"}
+                if selected_months:
+                    # Top cities plus "Other" for every selected month and metric in one call
+                    pie_data, _ = group_top_n_with_other_batch(city_month.long_frame(selected_months, list(metric_labels)), 'pie', 'value', top_n=8)
+                    pies = dict(tuple(pie_data.groupby('pie', sort=False)))
+                    for metric, metric_label in metric_labels.items():
+                        st.markdown(f"**📊 {metric_label} by City**")
+                        st.dataframe(city_month.compare(selected_months, metric).sort_values(selected_months[-1], ascending=False), use_container_width=True)
+                    # Pies, three months per row
+                    for row_start in range(0, len(selected_months), 3):
+                        row_months = selected_months[row_start:row_start + 3]
+                        for column, month in zip(st.columns(3), row_months):
+                            with column:
+                                st.write(f"**{month}**")
+                                for metric, metric_label in metric_labels.items():
+                                    city_data = pies.get(f"{metric}_{month}", pie_data.iloc[:0])
+                                    st.plotly_chart(plot_pie(city_data['ville'], city_data['value'], f"{metric_label} by City - {month}"), use_container_width=True, key=f"compare_{metric}_{month}")
+                else:
+                    st.info("Select at least one month to compare.")
+            else:
+                if len(month_options) > 1:
+                    delta_metric = st.selectbox("Metric", options=['Transactions', 'Unique_Customers'], format_func=lambda m: m.replace('_', ' '), key='delta_metric')
+                    deltas = city_month.deltas(delta_metric)
+                    # Keep the cities with the largest swings readable
+                    top_cities = deltas.abs().sum(axis=1).sort_values(ascending=False).index[:20]
+                    import plotly.express as px
+                    fig_deltas = px.imshow(
+                        deltas.loc[top_cities],
+                        color_continuous_scale='RdYlGn',
+                        color_continuous_midpoint=0,
+                        aspect='auto',
+                        title=f"Month-over-Month Change in {delta_metric.replace('_', ' ')} by City (top 20 by total change)"
+                    )
+                    fig_deltas.update_layout(xaxis_title="Month", yaxis_title="City")
+                    st.plotly_chart(fig_deltas, use_container_width=True, key="month_deltas_chart")
+                    st.dataframe(deltas.loc[top_cities], use_container_width=True)
+                else:
+                    st.info("At least two months are needed for month-over-month deltas.")
         else:
             st.info("Month or city data not available in this dataset.")
 else:
@@ -0,0 +1,40 @@
+# Pre-renders the dashboard for one country and date range as a self-contained HTML file
+# (plotly.js inlined once, figures embedded as data), so read-only viewers need no Python
+# session at all:
+#
+#     python build_report.py exports/*.csv.gz --country Tunisia --start 2025-01-01 --end 2025-06-30 -o report.html
+#
+# The report is stamped with the dataset version and filter; rerunning on an unchanged
+# file is a no-op, so the command can run from cron after every export.
+import argparse
+import datetime as dt
+from typing import List, Optional
+
+from src.api import COUNTRIES
+from src.data_loader import load_and_preprocess_data
+from src.registry import file_dataset_key, registry
+from src.report import existing_stamp, report_stamp, write_report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build a static HTML dashboard report")
+    parser.add_argument('csv', nargs='+', help="transaction exports: CSV, gzip or zip, e.g. one per month")
+    parser.add_argument('-o', '--output', default='report.html')
+    parser.add_argument('--country', default='All', choices=list(COUNTRIES))
+    parser.add_argument('--start', type=dt.date.fromisoformat, default=dt.date(2024, 5, 1))
+    parser.add_argument('--end', type=dt.date.fromisoformat, default=dt.date(2025, 6, 30))
+    parser.add_argument('--force', action='store_true', help="rebuild even if the report is up to date")
+    args = parser.parse_args(argv)
+
+    country = COUNTRIES[args.country]
+    key = file_dataset_key(args.csv)
+    if not args.force and existing_stamp(args.output) == report_stamp(key, country, args.start, args.end):
+        print(f"{args.output} is up to date (dataset {key[:12]})")
+        return
+    entry = registry.get_or_load(key, lambda: load_and_preprocess_data(args.csv))
+    write_report(entry, args.output, country, args.start, args.end)
+    print(f"Wrote {args.output} (dataset {key[:12]})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+# Local JSON endpoint with the numbers behind the dashboard's KPI cards, for wallboards
+# and alerting scripts that poll without loading the Streamlit UI:
+#
+#     python kpi_server.py transactions.csv --port 8502
+#     curl 'http://127.0.0.1:8502/kpi?start=2025-06-01&end=2025-06-30&country=Tunisia'
+#
+# Responses carry an ETag; send it back in If-None-Match to get a 304 while nothing changed.
+import argparse
+from typing import List, Optional
+
+from src.api import KpiService, make_server
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve dashboard KPIs as JSON")
+    parser.add_argument('csv', help="transaction export to serve; reloaded when the file changes")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    args = parser.parse_args(argv)
+
+    server = make_server(KpiService(args.csv), args.host, args.port)
+    print(f"Serving KPIs for {args.csv} on http://{args.host}:{args.port}/kpi")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+# Headless load test for app.py: drives the dashboard through Streamlit's AppTest with a
+# synthetic CSV, running N concurrent sessions that upload the file and then change
+# filters, radios and month pickers. Reports rerun latency percentiles and peak memory
+# per concurrency level.
+#
+#     python loadtest.py --rows 200000 --sessions 1 2 4 8 --actions 20
+import argparse
+import io
+import logging
+import os
+import random
+import resource
+import threading
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+FIRST_DAY = pd.Timestamp('2024-05-01')
+LAST_DAY = pd.Timestamp('2025-06-30')
+
+
+def synthetic_csv(rows: int, seed: int = 0) -> bytes:
+    # Same columns as the real export: ISO timestamps with Z, mixed status spellings, messy promo codes
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(FIRST_DAY, tz='UTC').value
+    end = pd.Timestamp(LAST_DAY + pd.Timedelta(hours=23), tz='UTC').value
+    created = pd.to_datetime(np.sort(rng.integers(start, end, rows)), utc=True)
+    gov = rng.choice(['Tunis', 'Sfax', 'Sousse', 'Casablanca', 'Rabat'], rows)
+    df = pd.DataFrame({
+        '_id': np.arange(rows),
+        'id_client': rng.integers(0, max(rows // 5, 1), rows),
+        'createdAt': created.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+        'amountToSend': rng.gamma(2, 100, rows).round(2),
+        'status': rng.choice(['complete', 'in progress', 'cancelled', 'canceled'], rows, p=[.8, .1, .07, .03]),
+        'distributionChannel': rng.choice(['cash pickup', 'bank transfer'], rows),
+        'country': rng.choice(['TUN', 'MAC'], rows),
+        'reason': rng.choice(['family', 'rent', 'gift', 'education', 'other'], rows),
+        'network': rng.choice([' poste ', 'Wafacash', 'attijari ', 'BIAT'], rows),
+        'gov': gov,
+        'ville': pd.Series(gov) + '-' + rng.integers(0, 12, rows).astype(str),
+        'promoCode': rng.choice(['', ' WELCOME ', 'summer24', None, 'Ramadan'], rows),
+        'nbTransactionsPaid': rng.integers(1, 6, rows),
+    })
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue().encode()
+
+
+def rss_mb() -> float:
+    # Current resident set size; falls back to the process peak off Linux
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class MemorySampler(threading.Thread):
+    def __init__(self, interval: float = 0.2):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = rss_mb()
+        self.done = threading.Event()
+
+    def run(self) -> None:
+        while not self.done.wait(self.interval):
+            self.peak = max(self.peak, rss_mb())
+
+    def stop(self) -> float:
+        self.done.set()
+        self.join()
+        return max(self.peak, rss_mb())
+
+
+def _set(widget_getter: Callable[[], object], value) -> bool:
+    # Widgets only exist when their tab/branch rendered; skip actions that do not apply
+    try:
+        widget_getter().set_value(value)
+    except (KeyError, IndexError):
+        return False
+    return True
+
+
+def _options(widget_getter: Callable[[], object]) -> List[str]:
+    try:
+        return list(widget_getter().options)
+    except (KeyError, IndexError):
+        return []
+
+
+def scripted_actions(at: AppTest, rng: random.Random) -> Callable[[], bool]:
+    # One random interaction per call, mirroring what an analyst clicks through
+    def date_range() -> bool:
+        days = (LAST_DAY - FIRST_DAY).days
+        start = FIRST_DAY + pd.Timedelta(days=rng.randrange(0, days - 30))
+        end = min(LAST_DAY, start + pd.Timedelta(days=rng.randrange(30, days)))
+        return _set(lambda: at.sidebar.date_input[0], start.date()) and _set(lambda: at.sidebar.date_input[1], end.date())
+
+    def country() -> bool:
+        return _set(lambda: at.sidebar.selectbox[0], rng.choice(["All", "Tunisia", "Morocco"]))
+
+    def view_by() -> bool:
+        key = rng.choice(['summary_view_by', 'customers_view_by', 'city_view_by'])
+        return _set(lambda: at.radio(key=key), rng.choice(["Month", "Day"]))
+
+    def breakdown_month() -> bool:
+        key = rng.choice(['country_period', 'customers_period', 'reason_period', 'network_period', 'gov_period'])
+        options = _options(lambda: at.selectbox(key=key))
+        return bool(options) and _set(lambda: at.selectbox(key=key), rng.choice(options))
+
+    def compare_months() -> bool:
+        options = _options(lambda: at.multiselect(key='compare_months'))
+        return bool(options) and _set(lambda: at.multiselect(key='compare_months'), rng.sample(options, min(len(options), rng.randint(1, 3))))
+
+    actions = [date_range, country, view_by, breakdown_month, compare_months]
+    return lambda: rng.choice(actions)()
+
+
+def run_session(data: bytes, actions: int, seed: int, latencies: List[float], errors: List[str], timeout: float) -> None:
+    rng = random.Random(seed)
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    def timed_run() -> None:
+        started = time.perf_counter()
+        at.run()
+        latencies.append(time.perf_counter() - started)
+        errors.extend(str(exception.value) for exception in at.exception)
+
+    try:
+        at.run()
+        at.sidebar.file_uploader[0].set_value(('loadtest.csv', data, 'text/csv'))
+        timed_run()
+        step = scripted_actions(at, rng)
+        done = 0
+        while done < actions:
+            if step():
+                timed_run()
+                done += 1
+    except Exception as exc:
+        errors.append(f"{type(exc).__name__}: {exc}")
+
+
+def run_level(data: bytes, sessions: int, actions: int, timeout: float, seed: int) -> dict:
+    latencies: List[float] = []
+    errors: List[str] = []
+    sampler = MemorySampler()
+    sampler.start()
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=run_session, args=(data, actions, seed + index, latencies, errors, timeout))
+        for index in range(sessions)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    peak = sampler.stop()
+    percentiles = np.percentile(latencies, [50, 95, 99]) if latencies else [float('nan')] * 3
+    return {
+        'sessions': sessions,
+        'reruns': len(latencies),
+        'p50': percentiles[0],
+        'p95': percentiles[1],
+        'p99': percentiles[2],
+        'max': max(latencies, default=float('nan')),
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'peak_mb': peak,
+        'errors': errors,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the Streamlit dashboard")
+    parser.add_argument('--rows', type=int, default=100_000, help="rows in the synthetic CSV")
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8], help="concurrency levels to run")
+    parser.add_argument('--actions', type=int, default=10, help="scripted interactions per session")
+    parser.add_argument('--timeout', type=float, default=600, help="seconds allowed per rerun")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    # Deprecation notices would repeat once per widget per rerun
+    logging.disable(logging.WARNING)
+
+    data = synthetic_csv(args.rows, args.seed)
+    print(f"Synthetic CSV: {args.rows:,} rows, {len(data) / 2**20:,.1f} MB; baseline RSS {rss_mb():,.0f} MB")
+    print(f"{'sessions':>8} {'reruns':>7} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'max s':>8} {'reruns/s':>9} {'peak MB':>9}")
+    for sessions in args.sessions:
+        result = run_level(data, sessions, args.actions, args.timeout, args.seed)
+        print(
+            f"{result['sessions']:>8} {result['reruns']:>7} {result['p50']:>8.2f} {result['p95']:>8.2f} "
+            f"{result['p99']:>8.2f} {result['max']:>8.2f} {result['throughput']:>9.2f} {result['peak_mb']:>9,.0f}"
+        )
+        for error in sorted(set(result['errors']))[:5]:
+            print(f"    error: {error}")
+
+
+if __name__ == '__main__':
+    main()
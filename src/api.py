@@ -0,0 +1,127 @@
+import datetime as dt
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from src.bitmaps import CustomerBitmapIndex
+from src.data_loader import load_and_preprocess_data
+from src.kpi import KpiEngine, kpi_report
+from src.registry import DatasetEntry, file_dataset_key, registry
+
+RESPONSE_CACHE_SIZE = 1024
+COUNTRIES = {'All': None, 'Tunisia': 'TUN', 'Morocco': 'MAC', 'TUN': 'TUN', 'MAC': 'MAC'}
+
+
+class KpiService:
+    # KPI card numbers for a CSV on disk. The file is re-read only when its size or
+    # mtime changes; its content hash is the dataset version, so the registry, the
+    # shared store and the Streamlit app all agree on which dataset this is.
+    def __init__(self, path: str, cache_size: int = RESPONSE_CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self._stat: Optional[Tuple[int, int]] = None
+        self._version: Optional[str] = None
+        self._responses: 'OrderedDict[Tuple[Any, ...], Tuple[str, bytes]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def dataset(self) -> DatasetEntry:
+        stat = os.stat(self.path)
+        with self._load_lock:
+            if self._stat != (stat.st_size, stat.st_mtime_ns):
+                self._version = file_dataset_key(self.path)
+                self._stat = (stat.st_size, stat.st_mtime_ns)
+            version = self._version
+        return registry.get_or_load(version, lambda: load_and_preprocess_data(self.path))
+
+    def report(self, start: dt.date, end: dt.date, country: Optional[str]) -> Tuple[str, bytes]:
+        # (ETag, JSON body), computed once per (dataset version, filter)
+        entry = self.dataset()
+        cache_key = (entry.key, country, start, end)
+        with self._lock:
+            cached = self._responses.get(cache_key)
+            if cached is not None:
+                self._responses.move_to_end(cache_key)
+                return cached
+        df = entry.df
+        engine = entry.index(('kpi', country), lambda: KpiEngine(df if country is None else df[df['country'] == country]))
+        customer_index = entry.index(('customer_bitmaps',), lambda: CustomerBitmapIndex(df))
+        body = {
+            'dataset_version': entry.key,
+            'country': country,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            **kpi_report(engine, customer_index, start, end, country),
+        }
+        payload = json.dumps(body).encode()
+        response = (f'"{hashlib.sha1(payload).hexdigest()}"', payload)
+        with self._lock:
+            self._responses[cache_key] = response
+            while len(self._responses) > self.cache_size:
+                self._responses.popitem(last=False)
+        return response
+
+
+def parse_filter(query: Dict[str, list]) -> Tuple[dt.date, dt.date, Optional[str]]:
+    def one(name: str, default: str) -> str:
+        return query.get(name, [default])[-1]
+    start = dt.date.fromisoformat(one('start', dt.date.min.isoformat()))
+    end = dt.date.fromisoformat(one('end', dt.date.max.isoformat()))
+    country = one('country', 'All')
+    if country not in COUNTRIES:
+        raise ValueError(f"unknown country {country!r}; expected one of {', '.join(COUNTRIES)}")
+    if start > end:
+        raise ValueError("start is after end")
+    return start, end, COUNTRIES[country]
+
+
+class KpiRequestHandler(BaseHTTPRequestHandler):
+    # GET /kpi?start=YYYY-MM-DD&end=YYYY-MM-DD&country=All|Tunisia|Morocco
+    service: KpiService
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if url.path != '/kpi':
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            start, end, country = parse_filter(parse_qs(url.query))
+        except ValueError as exc:
+            self._send_json(400, {'error': str(exc)})
+            return
+        try:
+            etag, payload = self.service.report(start, end, country)
+        except (OSError, KeyError, ValueError) as exc:
+            # Missing file or an export without the expected columns
+            self._send_json(503, {'error': f"{type(exc).__name__}: {exc}"})
+            return
+        # Pollers send back the last ETag; an unchanged answer costs a dict lookup and a 304
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self._send(200, payload, etag)
+
+    def _send_json(self, code: int, body: Dict[str, Any]) -> None:
+        self._send(code, json.dumps(body).encode())
+
+    def _send(self, code: int, payload: bytes, etag: Optional[str] = None) -> None:
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        if etag is not None:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def make_server(service: KpiService, host: str = '127.0.0.1', port: int = 8502) -> ThreadingHTTPServer:
+    handler = type('BoundKpiRequestHandler', (KpiRequestHandler,), {'service': service})
+    return ThreadingHTTPServer((host, port), handler)
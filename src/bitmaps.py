@@ -0,0 +1,125 @@
+import datetime as dt
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from src.kpi import normalize_status
+
+# Bit count of every byte value, used when np.bitwise_count is not available (numpy < 2)
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(bits: np.ndarray) -> int:
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(bits).sum(dtype=np.int64))
+    return int(_POPCOUNT[bits].sum(dtype=np.int64))
+
+
+class CustomerBitmapIndex:
+    # One compressed bitmap of active customer codes per (country, status, day).
+    # Sparse days are stored as sorted uint32 code arrays and dense days as packed
+    # bitsets, whichever is smaller, so a distinct count over any date range is an
+    # exact OR of the day bitmaps followed by a popcount.
+    def __init__(self, df: pd.DataFrame, slice_by: Iterable[str] = ('country', 'status')):
+        self.slice_by = [col for col in slice_by if col in df.columns]
+        days = df['transaction_date'].dt.normalize()
+        valid = (days.notna() & df['customer_id'].notna()).to_numpy()
+        codes, _ = pd.factorize(df['customer_id'][valid])
+        self.n_customers = int(codes.max()) + 1 if len(codes) else 0
+        self.n_bytes = (self.n_customers + 7) // 8
+        # Per-customer weights when indexing a customer sample, so distinct counts scale to the full data
+        self.weights = None
+        if 'sample_weight' in df.columns:
+            self.weights = np.zeros(self.n_customers)
+            self.weights[codes] = df['sample_weight'].to_numpy()[valid]
+        self.first_day = days[valid].min().date() if valid.any() else None
+        day_index = (days[valid] - pd.Timestamp(self.first_day)).dt.days.to_numpy() if valid.any() else np.zeros(0, dtype=np.int64)
+        self.n_days = int(day_index.max()) + 1 if len(day_index) else 0
+
+        if self.slice_by:
+            slice_frame = df.loc[valid, self.slice_by]
+            if 'status' in slice_frame.columns:
+                slice_frame['status'] = normalize_status(slice_frame['status'])
+            slice_ids, slice_keys = pd.MultiIndex.from_frame(slice_frame.astype(str)).factorize()
+            self.slices: List[tuple] = list(slice_keys)
+        else:
+            slice_ids = np.zeros(len(codes), dtype=np.int64)
+            self.slices = [()]
+
+        # One sort over the (slice, day, customer) triples gives every container at once
+        keys = (slice_ids.astype(np.int64) * self.n_days + day_index) * max(self.n_customers, 1) + codes
+        keys = np.unique(keys)
+        cells, members = np.divmod(keys, max(self.n_customers, 1))
+        bounds = np.flatnonzero(np.diff(cells)) + 1
+        self.containers: Dict[int, Dict[int, np.ndarray]] = {}
+        for cell, chunk in zip(cells[np.r_[0, bounds]] if len(cells) else [], np.split(members, bounds)):
+            slice_id, day = divmod(int(cell), self.n_days)
+            self.containers.setdefault(slice_id, {})[day] = self._compress(chunk.astype(np.uint32))
+
+    def _compress(self, members: np.ndarray) -> np.ndarray:
+        if members.nbytes < self.n_bytes:
+            return members
+        dense = np.zeros(self.n_customers, dtype=bool)
+        dense[members] = True
+        return np.packbits(dense, bitorder='little')
+
+    @property
+    def nbytes(self) -> int:
+        return sum(container.nbytes for days in self.containers.values() for container in days.values())
+
+    def memory_report(self) -> Dict[str, int]:
+        containers = [container for days in self.containers.values() for container in days.values()]
+        return {
+            'customers': self.n_customers,
+            'containers': len(containers),
+            'sparse': sum(container.dtype == np.uint32 for container in containers),
+            'dense': sum(container.dtype == np.uint8 for container in containers),
+            'bytes': self.nbytes,
+        }
+
+    def _matching_slices(self, filters: Dict[str, Optional[Union[str, List[str]]]]) -> List[int]:
+        matches = []
+        for slice_id, key in enumerate(self.slices):
+            values = dict(zip(self.slice_by, key))
+            if all(
+                wanted is None or col not in values or values[col] in ([wanted] if isinstance(wanted, str) else wanted)
+                for col, wanted in filters.items()
+            ):
+                matches.append(slice_id)
+        return matches
+
+    def bitmap(self, start: dt.date, end: dt.date, country: Optional[str] = None,
+               status: Optional[Union[str, List[str]]] = None) -> np.ndarray:
+        # Packed bitmap of customers active in the inclusive date window
+        bits = np.zeros(self.n_bytes, dtype=np.uint8)
+        if self.first_day is None:
+            return bits
+        lo = max((start - self.first_day).days, 0)
+        hi = min((end - self.first_day).days + 1, self.n_days)
+        sparse = []
+        for slice_id in self._matching_slices({'country': country, 'status': status}):
+            days = self.containers.get(slice_id, {})
+            for day in range(lo, hi):
+                container = days.get(day)
+                if container is None:
+                    continue
+                if container.dtype == np.uint8:
+                    np.bitwise_or(bits, container, out=bits)
+                else:
+                    sparse.append(container)
+        if sparse:
+            dense = np.zeros(self.n_customers, dtype=bool)
+            dense[np.concatenate(sparse)] = True
+            np.bitwise_or(bits, np.packbits(dense, bitorder='little'), out=bits)
+        return bits
+
+    def distinct(self, start: dt.date, end: dt.date, country: Optional[str] = None,
+                 status: Optional[Union[str, List[str]]] = None, exclude: Optional[np.ndarray] = None) -> int:
+        bits = self.bitmap(start, end, country, status)
+        if exclude is not None:
+            bits &= ~exclude
+        if self.weights is not None:
+            members = np.unpackbits(bits, bitorder='little', count=self.n_customers).astype(bool)
+            return int(round(self.weights[members].sum()))
+        return popcount(bits)
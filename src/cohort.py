@@ -1,23 +1,108 @@
+from typing import List, Tuple
+
 import pandas as pd
 import numpy as np
 
+GRANULARITIES = {'M': 'Month', 'W': 'Week', 'D': 'Day'}
+METRICS = {'customers': 'Customers', 'revenue': 'Revenue'}
+
+
+def period_codes(dates: pd.Series, granularity: str) -> np.ndarray:
+    # Integer period number per timestamp: days, Monday-based weeks or calendar months
+    days = dates.to_numpy(dtype='datetime64[D]').astype(np.int64)
+    if granularity == 'D':
+        return days
+    if granularity == 'W':
+        # 1970-01-01 was a Thursday; shifting by 3 days makes weeks start on Monday
+        return (days + 3) // 7
+    months = dates.to_numpy(dtype='datetime64[M]').astype(np.int64)
+    return months
+
+
+def period_starts(codes: np.ndarray, granularity: str) -> pd.DatetimeIndex:
+    if granularity == 'D':
+        return pd.DatetimeIndex(codes.astype('datetime64[D]'))
+    if granularity == 'W':
+        return pd.DatetimeIndex((codes * 7 - 3).astype('datetime64[D]'))
+    return pd.DatetimeIndex(codes.astype('datetime64[M]'))
+
+
+class CohortEngine:
+    # Cohort x age matrix kept as sparse COO cells (cohort, age, customers, revenue).
+    # Built in one sort over the distinct (customer, period) pairs: after sorting,
+    # each customer's first pair is their cohort and every pair adds one cell hit.
+    def __init__(self, df: pd.DataFrame, granularity: str = 'M'):
+        self.granularity = granularity
+        valid = (df['customer_id'].notna() & df['transaction_date'].notna()).to_numpy()
+        customers, _ = pd.factorize(df['customer_id'][valid])
+        periods = period_codes(df['transaction_date'][valid], granularity)
+        if 'amountToSend' in df.columns:
+            amounts = np.nan_to_num(df['amountToSend'].to_numpy(dtype=np.float64, na_value=np.nan)[valid])
+        else:
+            amounts = np.zeros(len(customers))
+        # Customer sample weights, constant per customer; 1 on the full data
+        weights = df['sample_weight'].to_numpy()[valid] if 'sample_weight' in df.columns else np.ones(len(customers))
+        amounts = amounts * weights
+
+        empty = np.zeros(0, dtype=np.int64)
+        self.cohorts, self.ages, self.customers, self.revenue = empty, empty, empty, np.zeros(0)
+        if len(customers) == 0:
+            return
+        first_period = periods.min()
+        span = int(periods.max() - first_period) + 1
+        keys = customers.astype(np.int64) * span + (periods - first_period)
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        pair_revenue = np.add.reduceat(amounts[order], starts)
+        pair_weight = weights[order][starts]
+        pair_customer, pair_period = np.divmod(keys[starts], span)
+        # Pairs are sorted by customer then period, so a customer's first pair is their cohort
+        first_pair = np.r_[True, pair_customer[1:] != pair_customer[:-1]]
+        pair_cohort = np.maximum.accumulate(np.where(first_pair, np.arange(len(pair_period)), 0))
+        pair_cohort = pair_period[pair_cohort]
+        pair_age = pair_period - pair_cohort
+
+        cells = pair_cohort * span + pair_age
+        cell_keys, cell_ids = np.unique(cells, return_inverse=True)
+        self.cohorts = cell_keys // span + first_period
+        self.ages = cell_keys % span
+        self.customers = np.bincount(cell_ids, weights=pair_weight, minlength=len(cell_keys))
+        self.revenue = np.bincount(cell_ids, weights=pair_revenue, minlength=len(cell_keys))
+
+    @property
+    def nbytes(self) -> int:
+        return self.cohorts.nbytes + self.ages.nbytes + self.customers.nbytes + self.revenue.nbytes
+
+    def labels(self, cohorts: np.ndarray) -> List[str]:
+        fmt = '%Y-%m' if self.granularity == 'M' else '%Y-%m-%d'
+        return list(period_starts(cohorts, self.granularity).strftime(fmt))
+
+    def counts(self, metric: str = 'customers') -> pd.DataFrame:
+        # Dense view of the non-empty region only: cohorts and ages that have any cell
+        values = self.customers if metric == 'customers' else self.revenue
+        cohorts, rows = np.unique(self.cohorts, return_inverse=True)
+        ages, cols = np.unique(self.ages, return_inverse=True)
+        dense = np.full((len(cohorts), len(ages)), np.nan)
+        dense[rows, cols] = values
+        return pd.DataFrame(
+            dense,
+            index=pd.Index(self.labels(cohorts), name='cohort_month'),
+            columns=pd.Index(ages + 1, name='cohort_index')
+        )
+
+    def retention(self, metric: str = 'customers') -> Tuple[pd.DataFrame, List[str]]:
+        # Share of each cohort's first-period customers (or revenue) seen at every age
+        counts = self.counts(metric)
+        if counts.empty:
+            return counts, []
+        cohort_sizes = counts.iloc[:, 0]
+        retention = counts.divide(cohort_sizes, axis=0).replace([np.inf, -np.inf], np.nan).round(3) * 100
+        fmt = (lambda size: f"{int(round(size))}") if metric == 'customers' else (lambda size: f"{size:,.0f}")
+        cohort_labels = [f"{label} ({fmt(size)})" for label, size in zip(counts.index, cohort_sizes)]
+        return retention, cohort_labels
+
+
 def run_cohort_analysis(df_country: pd.DataFrame):
-    df_country = df_country.copy()
-    # Assign cohort month (first transaction month per customer)
-    df_country['cohort_month'] = df_country.groupby('customer_id')['transaction_month'].transform('min')
-    # Extract year/month for transaction and cohort
-    transaction_year = df_country['transaction_month'].dt.year
-    transaction_month = df_country['transaction_month'].dt.month
-    cohort_year = df_country['cohort_month'].dt.year
-    cohort_month = df_country['cohort_month'].dt.month
-    # Calculate cohort index
-    df_country['cohort_index'] = (transaction_year - cohort_year) * 12 + (transaction_month - cohort_month) + 1
-    # Build cohort table (number of unique customers)
-    cohort_data = df_country.groupby(['cohort_month', 'cohort_index'])['customer_id'].nunique().reset_index()
-    cohort_counts = cohort_data.pivot_table(index='cohort_month', columns='cohort_index', values='customer_id')
-    # Compute retention rates
-    cohort_sizes = cohort_counts.iloc[:, 0]
-    retention = cohort_counts.divide(cohort_sizes, axis=0).round(3) * 100
-    retention.index = retention.index.strftime('%Y-%m')
-    cohort_labels = [f"{index.strftime('%Y-%m')} ({int(size)})" for index, size in zip(cohort_counts.index, cohort_sizes)]
-    return retention, cohort_labels 
\ No newline at end of file
+    # Calendar-month customer retention, kept for existing callers
+    return CohortEngine(df_country, 'M').retention('customers')
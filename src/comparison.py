@@ -0,0 +1,107 @@
+import datetime as dt
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+METRICS = ['Transactions', 'Unique_Customers']
+
+
+class CityMonthMatrix:
+    # Dense city x month matrices of transactions and distinct customers, built in one
+    # pass per dataset (and country), so any month (or set of months) can be read
+    # without touching the raw rows. window() narrows it to a date range.
+    def __init__(self, df: pd.DataFrame, label_col: str = 'ville'):
+        self.label_col = label_col
+        self.cities, self.months, self.values = self._count(df, label_col)
+
+    @staticmethod
+    def _count(df: pd.DataFrame, label_col: str) -> Tuple[pd.Index, pd.PeriodIndex, Dict[str, np.ndarray]]:
+        city_codes, cities = pd.factorize(df[label_col], sort=True)
+        month_codes, months = pd.factorize(df['transaction_month'].dt.to_period('M'), sort=True)
+        valid = (city_codes >= 0) & (month_codes >= 0)
+        n_cities, n_months = len(cities), len(months)
+        cells = city_codes[valid].astype(np.int64) * n_months + month_codes[valid]
+        # Rows of a customer sample count with their customer's weight
+        weights = df['sample_weight'].to_numpy()[valid] if 'sample_weight' in df.columns else None
+        transactions = np.bincount(cells, weights=weights, minlength=n_cities * n_months)
+        # Distinct customers: count each (cell, customer) pair once
+        customer_codes, _ = pd.factorize(df['customer_id'][valid])
+        n_customers = int(customer_codes.max()) + 1 if len(customer_codes) else 1
+        known = customer_codes >= 0
+        pairs = pd.unique(cells[known] * n_customers + customer_codes[known])
+        customer_weights = None
+        if weights is not None:
+            customer_weights = np.zeros(n_customers)
+            customer_weights[customer_codes[known]] = weights[known]
+            customer_weights = customer_weights[pairs % n_customers]
+        customers = np.bincount(pairs // n_customers, weights=customer_weights, minlength=n_cities * n_months)
+        if weights is not None:
+            transactions, customers = transactions.round().astype(np.int64), customers.round().astype(np.int64)
+        return cities, months, {
+            'Transactions': transactions.reshape(n_cities, n_months),
+            'Unique_Customers': customers.reshape(n_cities, n_months),
+        }
+
+    def window(self, start: dt.date, end: dt.date, frame: pd.DataFrame) -> 'CityMonthMatrix':
+        # The months of [start, end]: full months are column slices, and the partial
+        # boundary months are recounted exactly from `frame` (rows already filtered
+        # to the range and country). Cities and months without activity are dropped.
+        first, last = pd.Period(start, 'M'), pd.Period(end, 'M')
+        keep = (self.months >= first) & (self.months <= last)
+        months = self.months[keep]
+        values = {metric: matrix[:, keep].copy() for metric, matrix in self.values.items()}
+        partial = [month for month in dict.fromkeys([first, last]) if month in months and (month.start_time.date() < start or month.end_time.date() > end)]
+        if partial:
+            for matrix in values.values():
+                matrix[:, months.get_indexer(partial)] = 0
+            rows = frame[frame['transaction_month'].dt.to_period('M').isin(partial)]
+            cities, recount_months, recount = self._count(rows, self.label_col)
+            city_rows = self.cities.get_indexer(cities)[:, None]
+            month_columns = months.get_indexer(recount_months)[None, :]
+            for metric, matrix in values.items():
+                matrix[city_rows, month_columns] = recount[metric]
+        active_cities = values['Transactions'].any(axis=1) | values['Unique_Customers'].any(axis=1)
+        active_months = values['Transactions'].any(axis=0) | values['Unique_Customers'].any(axis=0)
+        window = object.__new__(CityMonthMatrix)
+        window.label_col = self.label_col
+        window.cities, window.months = self.cities[active_cities], months[active_months]
+        window.values = {metric: matrix[active_cities][:, active_months] for metric, matrix in values.items()}
+        return window
+
+    @property
+    def nbytes(self) -> int:
+        return sum(matrix.nbytes for matrix in self.values.values())
+
+    def month_labels(self) -> List[str]:
+        return [str(month) for month in self.months]
+
+    def month_frame(self, month: str, metric: str) -> pd.DataFrame:
+        column = self.values[metric][:, self.months.get_loc(pd.Period(month, freq='M'))]
+        active = column > 0
+        return pd.DataFrame({self.label_col: self.cities[active], metric: column[active]})
+
+    def compare(self, months: List[str], metric: str) -> pd.DataFrame:
+        # Wide city x month frame for any number of selected months
+        positions = [self.months.get_loc(pd.Period(month, freq='M')) for month in months]
+        wide = pd.DataFrame(self.values[metric][:, positions], index=self.cities, columns=months)
+        wide.index.name = self.label_col
+        return wide[wide.sum(axis=1) > 0]
+
+    def deltas(self, metric: str) -> pd.DataFrame:
+        # Month-over-month change for every city across the whole range
+        matrix = self.values[metric]
+        diff = np.diff(matrix, axis=1)
+        wide = pd.DataFrame(diff, index=self.cities, columns=self.month_labels()[1:])
+        wide.index.name = self.label_col
+        return wide
+
+    def long_frame(self, months: List[str], metrics: List[str]) -> pd.DataFrame:
+        # (pie, city, value) rows for every month/metric pair, ready for one batched top-N call
+        frames = [
+            self.month_frame(month, metric).rename(columns={metric: 'value'}).assign(pie=f"{metric}_{month}")
+            for month in months for metric in metrics
+        ]
+        if not frames:
+            return pd.DataFrame(columns=['pie', self.label_col, 'value'])
+        return pd.concat(frames, ignore_index=True)[['pie', self.label_col, 'value']]
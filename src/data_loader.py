@@ -1,40 +1,146 @@
 import pandas as pd
+import numpy as np
 import datetime as dt
-from typing import Optional, Tuple
-
-def load_and_preprocess_data(file_path: str, preserve_columns: bool = False) -> pd.DataFrame:
-    df = pd.read_csv(file_path)
-    
-    if preserve_columns:
-        # Keep original column names but still do necessary preprocessing
-        original_columns = df.columns.tolist()
-        # Convert to datetime and remove timezone
-        df['transaction_date'] = pd.to_datetime(df['createdAt'] if 'createdAt' in df.columns else df['transaction_date'])
-        df['transaction_date'] = df['transaction_date'].dt.tz_localize(None)
-        # Extract transaction_month
-        df['transaction_month'] = df['transaction_date'].apply(lambda x: dt.datetime(x.year, x.month, 1))
-        # Convert amountToSend to numeric, handling any non-numeric values
-        if 'amountToSend' in df.columns:
-            df['amountToSend'] = pd.to_numeric(df['amountToSend'], errors='coerce')
-        return df
-    else:
+import gzip
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, List, Optional, Sequence, Tuple, Union
+
+from src.timestamps import ATTR as TIMESTAMP_ATTR, merge_reports, parse_timestamps, sample_format
+
+# Files are parsed in parallel on threads: zlib and the C CSV tokenizer release the GIL,
+# and threads hand the parsed frames back without pickling them
+PARSE_WORKERS = int(os.environ.get('EASY_DASHBOARD_PARSE_WORKERS', str(os.cpu_count() or 1)))
+parse_pool = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix='parse')
+
+# filter_data returns the input frame (or a view of it) without a defensive copy; with
+# copy-on-write a caller that modifies the result copies on write instead of changing
+# the base frame. Default from pandas 3 on.
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZIP_MAGIC = b'PK\x03\x04'
+
+class CsvSource:
+    # One CSV stream inside an upload. `position` reports how many of the upload's
+    # `size` (compressed) bytes have been consumed, for progress.
+    def __init__(self, name: str, stream: BinaryIO, size: int, position: Callable[[], int]):
+        self.name = name
+        self.stream = stream
+        self.size = size
+        self.position = position
+
+def csv_sources(name: str, handle: BinaryIO) -> List[CsvSource]:
+    # Plain, gzip or zip (one source per CSV member); decompression streams as pandas reads
+    magic = handle.read(4)
+    size = handle.seek(0, io.SEEK_END)
+    handle.seek(0)
+    if magic.startswith(GZIP_MAGIC):
+        return [CsvSource(name, gzip.GzipFile(fileobj=handle, mode='rb'), size, handle.tell)]
+    if magic == ZIP_MAGIC:
+        archive = zipfile.ZipFile(handle)
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir() and info.filename.lower().endswith('.csv') and not info.filename.startswith('__MACOSX/')
+        ]
+        if not members:
+            raise ValueError(f"{name} contains no CSV files")
+        sources = []
+        for info in members:
+            stream = archive.open(info)
+            # Zip members only expose their uncompressed offset; scale it to the compressed size
+            position = lambda stream=stream, info=info: stream.tell() * info.compress_size // max(info.file_size, 1)
+            sources.append(CsvSource(f"{name}/{info.filename}", stream, info.compress_size, position))
+        return sources
+    return [CsvSource(name, handle, size, handle.tell)]
+
+def concat_aligned(frames: Sequence[pd.DataFrame]) -> pd.DataFrame:
+    # One frame from several files: columns are matched by name in first-seen order,
+    # columns missing from a file are NaN there, and differing dtypes widen to a common one
+    frames = [frame for frame in frames if len(frame.columns)]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    non_empty = [frame for frame in frames if len(frame)] or frames[:1]
+    columns = list(dict.fromkeys(column for frame in frames for column in frame.columns))
+    combined = pd.concat(non_empty, ignore_index=True, sort=False).reindex(columns=columns)
+    # concat drops attrs that differ between inputs; keep one report for the whole dataset
+    report = merge_reports([frame.attrs.get(TIMESTAMP_ATTR) for frame in frames])
+    combined.attrs = {TIMESTAMP_ATTR: report} if report else {}
+    return combined
+
+def _parse_source(source: CsvSource, preserve_columns: bool) -> pd.DataFrame:
+    return preprocess_chunk(pd.read_csv(source.stream), preserve_columns)
+
+def canonical_promo_codes(promo: pd.Series) -> pd.Categorical:
+    # Strip/lowercase each distinct raw code once; blanks become missing
+    raw_codes, raw_values = pd.factorize(promo)
+    clean_values = pd.Index(raw_values.astype(str)).str.strip().str.lower()
+    categories = pd.Index(sorted(set(clean_values) - {''}))
+    mapping = categories.get_indexer(clean_values)
+    codes = np.where(raw_codes >= 0, mapping[raw_codes] if len(mapping) else -1, -1)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+def load_and_preprocess_data(file_path: Union[str, BinaryIO, Sequence[Union[str, BinaryIO]]], preserve_columns: bool = False) -> pd.DataFrame:
+    # One or more CSV files, each plain, gzip or zip; every CSV is parsed on the worker pool
+    paths = list(file_path) if isinstance(file_path, (list, tuple)) else [file_path]
+    handles = [open(path, 'rb') if isinstance(path, (str, os.PathLike)) else path for path in paths]
+    try:
+        sources = [source for path, handle in zip(paths, handles) for source in csv_sources(str(path), handle)]
+        frames = list(parse_pool.map(lambda source: _parse_source(source, preserve_columns), sources))
+    finally:
+        for path, handle in zip(paths, handles):
+            if handle is not path:
+                handle.close()
+    return finalize_data(concat_aligned(frames))
+
+def timestamp_format(df: pd.DataFrame) -> Optional[str]:
+    # Timestamp layout of a raw chunk, so later chunks of the same file can reuse it
+    values = df['createdAt' if 'createdAt' in df.columns else 'transaction_date']
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return None
+    return sample_format(values)
+
+def preprocess_chunk(df: pd.DataFrame, preserve_columns: bool = False, timestamp_fmt: Optional[str] = None) -> pd.DataFrame:
+    # Row-local preprocessing: every chunk of a file can go through it independently
+    # Unparsed rows are reported under the column name the file uses
+    source_col = 'createdAt' if 'createdAt' in df.columns else 'transaction_date'
+    if not preserve_columns:
         # Rename columns for consistency
         df.rename(columns={
             'id_client': 'customer_id',
             'createdAt': 'transaction_date'
         }, inplace=True)
-        # Convert to datetime and remove timezone
-        df['transaction_date'] = pd.to_datetime(df['transaction_date'])
-        df['transaction_date'] = df['transaction_date'].dt.tz_localize(None)
-        # Extract transaction_month
-        df['transaction_month'] = df['transaction_date'].apply(lambda x: dt.datetime(x.year, x.month, 1))
-        # Convert amountToSend to numeric, handling any non-numeric values
-        if 'amountToSend' in df.columns:
-            df['amountToSend'] = pd.to_numeric(df['amountToSend'], errors='coerce')
-        return df
+    # Convert to naive datetimes (wall time, timezone suffix dropped); unparsed rows are reported in attrs
+    column = source_col if preserve_columns else 'transaction_date'
+    df['transaction_date'], report = parse_timestamps(df[column], source_col, timestamp_fmt)
+    if report:
+        df.attrs[TIMESTAMP_ATTR] = report
+    # Extract transaction_month
+    df['transaction_month'] = df['transaction_date'].dt.to_period('M').dt.to_timestamp()
+    # Convert amountToSend to numeric, handling any non-numeric values
+    if 'amountToSend' in df.columns:
+        df['amountToSend'] = pd.to_numeric(df['amountToSend'], errors='coerce')
+    return df
+
+def finalize_data(df: pd.DataFrame) -> pd.DataFrame:
+    # Dataset-level preprocessing that needs all rows at once
+    # Canonical promo code dimension
+    if 'promoCode' in df.columns:
+        df['promoCode_clean'] = canonical_promo_codes(df['promoCode'])
+    return df
 
 def filter_data(df: pd.DataFrame, start_date: dt.datetime, end_date: dt.datetime, country: Optional[str]=None) -> pd.DataFrame:
     mask = (df['transaction_date'] >= start_date) & (df['transaction_date'] <= end_date)
     if country:
         mask &= (df['country'] == country)
-    return df[mask].copy() 
\ No newline at end of file
+    # Copy-on-write is on (set above), so the filtered frame never needs a defensive copy.
+    # A full range still returns a new (shallow) frame: it shares the column buffers, but
+    # adding or assigning a column on it leaves the caller's frame alone.
+    if mask.all():
+        return df.copy(deep=False)
+    return df[mask]
@@ -0,0 +1,127 @@
+import datetime as dt
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from src.sampling import weighted_counts
+
+
+class GeoHierarchy:
+    # country -> gov -> ville tree with precomputed monthly, daily and network
+    # series per city, built once per dataset (and country) so the Cities tab renders
+    # without scanning the frame. window() narrows it to a date range.
+    def __init__(self, df: pd.DataFrame):
+        city = df[df[['gov', 'ville']].notna().all(axis=1)]
+        countries = city['country'] if 'country' in city.columns else pd.Series('All', index=city.index)
+        tree: Dict[str, Dict[str, List[str]]] = {}
+        for (country, gov), villes in city.groupby([countries, 'gov'])['ville'].unique().items():
+            tree.setdefault(country, {})[gov] = sorted(villes)
+        monthly, network = self._series(city)
+        # Transactions count rows with a customer, as the Cities tab always has
+        active = city[city['customer_id'].notna()]
+        daily = self._activity(active.assign(day=active['transaction_date'].dt.normalize()), ['gov', 'ville', 'day'])
+        self._set(tree, monthly, daily, network)
+
+    def _set(self, tree: Dict[str, Dict[str, List[str]]], monthly: pd.DataFrame, daily: pd.DataFrame, network: pd.DataFrame) -> None:
+        # Series stay in single frames sorted by (gov, ville, ...); a city lookup is an index seek
+        self.tree = tree
+        self.gov_villes: Dict[str, List[str]] = {}
+        for govs in self.tree.values():
+            for gov, villes in govs.items():
+                self.gov_villes[gov] = sorted(set(self.gov_villes.get(gov, [])) | set(villes))
+        self._monthly = monthly.sort_index()
+        self._daily = daily.sort_index()
+        self._network = network.sort_index()
+
+    @classmethod
+    def _series(cls, city: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        # Monthly activity and monthly network counts of city rows
+        active = city[city['customer_id'].notna()]
+        monthly = cls._activity(active, ['gov', 'ville', 'transaction_month'])
+        network = pd.DataFrame(columns=['Transaction Count'])
+        if 'network' in city.columns:
+            named = city.assign(Network=city['network'].str.strip().str.title())
+            network = weighted_counts(named, ['gov', 'ville', 'transaction_month', 'Network']).rename('Transaction Count').to_frame()
+        return monthly, network
+
+    @staticmethod
+    def _activity(city: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+        return pd.DataFrame({
+            'Transactions': weighted_counts(city, keys),
+            'Active_Customers': weighted_counts(city, keys, 'customer_id'),
+        })
+
+    @staticmethod
+    def _in_months(series: pd.DataFrame, first: pd.Period, last: pd.Period, partial: List[pd.Period]) -> pd.DataFrame:
+        if series.empty:
+            return series
+        months = series.index.get_level_values('transaction_month').to_period('M')
+        return series[(months >= first) & (months <= last) & ~months.isin(partial)]
+
+    def window(self, start: dt.date, end: dt.date, frame: pd.DataFrame) -> 'GeoHierarchy':
+        # The hierarchy of [start, end]: daily series are sliced by day, monthly series keep
+        # the full months, and the partial boundary months are recounted exactly from
+        # `frame` (rows already filtered to the range and country)
+        first, last = pd.Period(start, 'M'), pd.Period(end, 'M')
+        partial = [month for month in dict.fromkeys([first, last]) if month.start_time.date() < start or month.end_time.date() > end]
+        monthly = self._in_months(self._monthly, first, last, partial)
+        network = self._in_months(self._network, first, last, partial)
+        if partial:
+            rows = frame[frame['transaction_month'].dt.to_period('M').isin(partial)]
+            recount_monthly, recount_network = self._series(rows[rows[['gov', 'ville']].notna().all(axis=1)])
+            monthly = pd.concat([monthly, recount_monthly])
+            network = pd.concat([network, recount_network]) if not recount_network.empty else network
+        days = self._daily.index.get_level_values('day')
+        daily = self._daily[(days >= pd.Timestamp(start)) & (days <= pd.Timestamp(end))]
+        cities = set(monthly.index.droplevel(2)) | set(network.index.droplevel([2, 3]) if not network.empty else [])
+        tree: Dict[str, Dict[str, List[str]]] = {}
+        for country, govs in self.tree.items():
+            for gov, villes in govs.items():
+                kept = [ville for ville in villes if (gov, ville) in cities]
+                if kept:
+                    tree.setdefault(country, {})[gov] = kept
+        window = object.__new__(GeoHierarchy)
+        window._set(tree, monthly, daily, network)
+        return window
+
+    def _city(self, series: pd.DataFrame, gov: str, ville: str) -> Optional[pd.DataFrame]:
+        if series.empty:
+            return None
+        try:
+            return series.loc[(gov, ville)]
+        except KeyError:
+            return None
+
+    @property
+    def nbytes(self) -> int:
+        return sum(int(frame.memory_usage(deep=True).sum()) for frame in (self._monthly, self._daily, self._network))
+
+    def govs(self, country: Optional[str] = None) -> List[str]:
+        if country is not None:
+            return sorted(self.tree.get(country, {}))
+        return sorted(self.gov_villes)
+
+    def villes(self, gov: str) -> List[str]:
+        return self.gov_villes.get(gov, [])
+
+    def monthly(self, gov: str, ville: str) -> pd.DataFrame:
+        monthly = self._city(self._monthly, gov, ville)
+        return (pd.DataFrame(columns=['Transactions', 'Active_Customers']) if monthly is None else monthly).reset_index()
+
+    def daily(self, gov: str, ville: str) -> pd.DataFrame:
+        daily = self._city(self._daily, gov, ville)
+        return pd.DataFrame(columns=['Transactions', 'Active_Customers']) if daily is None else daily
+
+    def months(self, gov: str, ville: str) -> List[str]:
+        monthly = self._city(self._monthly, gov, ville)
+        return [] if monthly is None else [str(month) for month in monthly.index.to_period('M')]
+
+    def network(self, gov: str, ville: str, month: Optional[str] = None) -> pd.DataFrame:
+        # Network breakdown for one city, for a single month or the whole period
+        counts = self._city(self._network, gov, ville)
+        if counts is None:
+            return pd.DataFrame(columns=['Network', 'Transaction Count'])
+        if month is not None:
+            counts = counts[counts.index.get_level_values('transaction_month').to_period('M') == pd.Period(month)]
+        totals = counts.groupby(level='Network')['Transaction Count'].sum().sort_values(ascending=False, kind='stable')
+        return totals.reset_index()
@@ -0,0 +1,149 @@
+import io
+import threading
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+from src.data_loader import CsvSource, concat_aligned, csv_sources, finalize_data, parse_pool, preprocess_chunk, timestamp_format
+from src.registry import DatasetEntry, registry
+from src.shared import publish_shared
+
+CHUNK_ROWS = 200_000
+
+
+class IngestionJob:
+    # Parses uploaded CSVs (plain, gzip or zip, any number of files) in chunks on a
+    # background thread, one file per parse worker. The rows ingested so far can be
+    # read at any time, so the page can render from the prefix.
+    def __init__(self, data: Union[bytes, Sequence[Tuple[str, bytes]]], chunk_rows: int = CHUNK_ROWS,
+                 on_complete: Optional[Callable[[pd.DataFrame], Any]] = None):
+        self._files = [('upload.csv', data)] if isinstance(data, bytes) else list(data)
+        self.total_bytes = sum(len(content) for _, content in self._files)
+        self.bytes_read = 0
+        self.rows = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._chunk_rows = chunk_rows
+        self._on_complete = on_complete
+        self.complete_error: Optional[BaseException] = None
+        self._chunks: List[List[pd.DataFrame]] = []
+        self._positions: List[int] = []
+        self._snapshot: Optional[pd.DataFrame] = None
+        self._partial: Optional[DatasetEntry] = None
+        self._result: Optional[pd.DataFrame] = None
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='ingestion', daemon=True)
+        self._thread.start()
+
+    def _parse(self, index: int, source: CsvSource) -> None:
+        # The timestamp layout is detected on the file's first chunk and kept for the rest,
+        # so one file never mixes day-first and month-first readings
+        fmt = None
+        for chunk in pd.read_csv(source.stream, chunksize=self._chunk_rows):
+            fmt = fmt or timestamp_format(chunk)
+            chunk = preprocess_chunk(chunk, timestamp_fmt=fmt)
+            with self._lock:
+                self._chunks[index].append(chunk)
+                self._snapshot = None
+                self.rows += len(chunk)
+                self._positions[index] = source.position()
+                self.bytes_read = sum(self._positions)
+        with self._lock:
+            self._positions[index] = source.size
+            self.bytes_read = sum(self._positions)
+
+    def _run(self) -> None:
+        try:
+            sources = [source for name, content in self._files for source in csv_sources(name, io.BytesIO(content))]
+            self._chunks = [[] for _ in sources]
+            self._positions = [0] * len(sources)
+            # Every file streams through its own worker; the first error wins
+            for future in [parse_pool.submit(self._parse, index, source) for index, source in enumerate(sources)]:
+                future.result()
+            frames = [concat_aligned(chunks) for chunks in self._chunks if chunks]
+            result = finalize_data(concat_aligned(frames))
+            if self._on_complete is not None:
+                # A failing hook (e.g. publishing to the shared store) must not lose the data
+                try:
+                    self._on_complete(result)
+                except Exception as exc:
+                    self.complete_error = exc
+            with self._lock:
+                self._result = result
+                self._chunks = []
+                self.bytes_read = self.total_bytes
+        except Exception as exc:
+            self.error = exc
+        finally:
+            self._files = []
+            with self._lock:
+                self._chunks = []
+                self._snapshot = None
+                self._partial = None
+            self.done = True
+
+    @property
+    def progress(self) -> float:
+        return self.bytes_read / self.total_bytes if self.total_bytes else 1.0
+
+    def snapshot(self) -> pd.DataFrame:
+        # Rows ingested so far, concatenated once per new chunk
+        with self._lock:
+            if self._result is not None:
+                return self._result
+            chunks = [chunk for file_chunks in self._chunks for chunk in file_chunks]
+            if self._snapshot is None and chunks:
+                self._snapshot = concat_aligned(chunks)
+            return self._snapshot if self._snapshot is not None else pd.DataFrame()
+
+    def partial_entry(self, key: str) -> DatasetEntry:
+        # Entry for the current snapshot, shared by every polling session: its KPI and
+        # bitmap indexes are rebuilt once per new chunk, not once per poll
+        snapshot = self.snapshot()
+        with self._lock:
+            if self._partial is None or self._partial.df is not snapshot:
+                self._partial = DatasetEntry(key + ':partial', snapshot)
+            return self._partial
+
+    def result(self) -> pd.DataFrame:
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+        return self._result
+
+
+# One job per dataset key, shared by every session uploading the same file
+_jobs: Dict[str, IngestionJob] = {}
+_jobs_lock = threading.Lock()
+
+
+def _complete(key: str, df: pd.DataFrame) -> None:
+    # The finished frame goes into the registry, under its memory budget, and the job is
+    # dropped here rather than by whichever session sees it done: the uploading session
+    # may be gone by then
+    try:
+        publish_shared(key, df)
+    finally:
+        # Prefer the memory-mapped copy when it was just published
+        if registry.get(key) is None:
+            registry.put(key, df)
+        finish_ingestion(key)
+
+
+def start_ingestion(key: str, data: Union[bytes, Sequence[Tuple[str, bytes]]]) -> IngestionJob:
+    with _jobs_lock:
+        job = _jobs.get(key)
+        if job is None:
+            job = _jobs[key] = IngestionJob(data, on_complete=partial(_complete, key))
+        return job
+
+
+def finish_ingestion(key: str) -> None:
+    with _jobs_lock:
+        _jobs.pop(key, None)
+
+
+def get_ingestion(key: str) -> Optional[IngestionJob]:
+    with _jobs_lock:
+        return _jobs.get(key)
@@ -0,0 +1,169 @@
+import datetime as dt
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+STATUSES = ['complete', 'in progress', 'cancelled']
+STATUS_LABELS = {'complete': 'completed', 'in progress': 'in progress', 'cancelled': 'cancelled'}
+# Column for statuses outside STATUSES; they are kept out of the totals like the original cards did
+OTHER = len(STATUSES)
+
+
+def normalize_status(status: pd.Series) -> pd.Series:
+    return status.replace({'canceled': 'cancelled'})
+
+
+def status_codes(df: pd.DataFrame) -> np.ndarray:
+    if 'status' not in df.columns:
+        return np.full(len(df), OTHER, dtype=np.int64)
+    codes = pd.Categorical(normalize_status(df['status']), categories=STATUSES).codes.astype(np.int64)
+    codes[codes < 0] = OTHER
+    return codes
+
+
+class KpiEngine:
+    # Per-day, per-status transaction counts and amount sums stored as prefix sums,
+    # so the totals of any date window are a difference of two rows.
+    ARRAYS = ('count_cum', 'amount_cum', 'active_days')
+
+    def __init__(self, df: pd.DataFrame):
+        self.has_status = 'status' in df.columns
+        self.has_amount = 'amountToSend' in df.columns
+        days = df['transaction_date'].dt.normalize()
+        valid = days.notna().to_numpy()
+        if valid.any():
+            self.first_day = days[valid].min().date()
+            day_index = (days[valid] - pd.Timestamp(self.first_day)).dt.days.to_numpy()
+            self.n_days = int(day_index.max()) + 1
+        else:
+            self.first_day = None
+            day_index = np.zeros(0, dtype=np.int64)
+            self.n_days = 0
+        width = OTHER + 1
+        cells = day_index * width + status_codes(df)[valid]
+        # Rows of a customer sample carry weights that scale them back to the full data
+        weights = df['sample_weight'].to_numpy()[valid] if 'sample_weight' in df.columns else None
+        counts = np.bincount(cells, weights=weights, minlength=self.n_days * width).reshape(self.n_days, width)
+        if self.has_amount:
+            amount = np.nan_to_num(df['amountToSend'].to_numpy(dtype=np.float64, na_value=np.nan)[valid])
+            if weights is not None:
+                amount = amount * weights
+            amounts = np.bincount(cells, weights=amount, minlength=self.n_days * width).reshape(self.n_days, width)
+        else:
+            amounts = np.zeros((self.n_days, width))
+        self.count_cum = np.vstack([np.zeros((1, width), dtype=counts.dtype), np.cumsum(counts, axis=0)])
+        self.amount_cum = np.vstack([np.zeros((1, width)), np.cumsum(amounts, axis=0)])
+        self.active_days = np.flatnonzero(counts.sum(axis=1))
+
+    @classmethod
+    def from_arrays(cls, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> 'KpiEngine':
+        # Rebuild from previously exported state, e.g. memory-mapped .npy files
+        engine = cls.__new__(cls)
+        engine.has_status = meta['has_status']
+        engine.has_amount = meta['has_amount']
+        engine.first_day = dt.date.fromisoformat(meta['first_day']) if meta['first_day'] else None
+        engine.n_days = meta['n_days']
+        for name in cls.ARRAYS:
+            setattr(engine, name, arrays[name])
+        return engine
+
+    def to_arrays(self) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        meta = {
+            'has_status': self.has_status,
+            'has_amount': self.has_amount,
+            'first_day': self.first_day.isoformat() if self.first_day else None,
+            'n_days': self.n_days,
+        }
+        return meta, {name: getattr(self, name) for name in self.ARRAYS}
+
+    @property
+    def nbytes(self) -> int:
+        return self.count_cum.nbytes + self.amount_cum.nbytes + self.active_days.nbytes
+
+    def _offsets(self, start: dt.date, end: dt.date) -> Tuple[int, int]:
+        if self.first_day is None:
+            return 0, 0
+        lo = min(max((start - self.first_day).days, 0), self.n_days)
+        hi = min(max((end - self.first_day).days + 1, 0), self.n_days)
+        return lo, max(lo, hi)
+
+    def latest_day(self, start: dt.date, end: dt.date) -> Optional[dt.date]:
+        lo, hi = self._offsets(start, end)
+        pos = np.searchsorted(self.active_days, hi) - 1
+        if pos < 0 or self.active_days[pos] < lo:
+            return None
+        return self.first_day + dt.timedelta(days=int(self.active_days[pos]))
+
+    def window(self, start: dt.date, end: dt.date) -> Dict[str, Dict[str, float]]:
+        # Totals for the inclusive date window [start, end]
+        lo, hi = self._offsets(start, end)
+        counts = self.count_cum[hi] - self.count_cum[lo]
+        amounts = self.amount_cum[hi] - self.amount_cum[lo]
+        result = {
+            'transactions': {status: int(round(counts[i])) for i, status in enumerate(STATUSES)},
+            'amount': {status: float(amounts[i]) for i, status in enumerate(STATUSES)},
+        }
+        if self.has_status:
+            result['transactions']['total'] = int(round(counts[:OTHER].sum()))
+            result['amount']['total'] = float(amounts[:OTHER].sum())
+        else:
+            result['transactions']['total'] = int(round(counts.sum()))
+            result['amount']['total'] = float(amounts.sum())
+        return result
+
+
+def kpi_windows(latest: dt.date, start: dt.date, end: dt.date) -> Dict[str, Tuple[dt.date, dt.date]]:
+    # Calendar windows ending on the latest day, clipped to the selected date range
+    quarter_month = 3 * ((latest.month - 1) // 3) + 1
+    windows = {
+        'today': (latest, latest),
+        'this_month': (latest.replace(day=1), latest),
+        'last_7_days': (latest - dt.timedelta(days=6), latest),
+        'last_30_days': (latest - dt.timedelta(days=29), latest),
+        'quarter_to_date': (latest.replace(month=quarter_month, day=1), latest),
+        'year_to_date': (latest.replace(month=1, day=1), latest),
+    }
+    return {name: (max(lo, start), min(hi, end)) for name, (lo, hi) in windows.items()}
+
+
+def customer_breakdown(customer_index: Any, start: dt.date, end: dt.date, country: Optional[str] = None,
+                       exclude: Optional[np.ndarray] = None) -> Dict[str, int]:
+    # Distinct customers per status from a CustomerBitmapIndex, plus the total
+    values = {status: customer_index.distinct(start, end, country, status, exclude) for status in STATUSES}
+    values['total'] = customer_index.distinct(start, end, country, exclude=exclude)
+    return values
+
+
+def kpi_report(engine: 'KpiEngine', customer_index: Any, start: dt.date, end: dt.date, country: Optional[str] = None,
+               names: Tuple[str, ...] = ('today', 'this_month')) -> Dict[str, Any]:
+    # The numbers behind the KPI cards as plain data: transactions, active and new
+    # customers and amounts per status for each window ending on the latest day
+    latest = engine.latest_day(start, end)
+    report: Dict[str, Any] = {'latest_date': latest.isoformat() if latest else None, 'has_status': engine.has_status}
+    if latest is None:
+        return report
+    windows = kpi_windows(latest, start, end)
+    for name in names:
+        lo, hi = windows[name]
+        totals = engine.window(lo, hi)
+        # New customers: active in the window but not earlier in the selected range
+        before = customer_index.bitmap(start, lo - dt.timedelta(days=1), country)
+        report[name] = {
+            'start': lo.isoformat(),
+            'end': hi.isoformat(),
+            'transactions': totals['transactions'],
+            'active_customers': customer_breakdown(customer_index, lo, hi, country),
+            'new_customers': customer_breakdown(customer_index, lo, hi, country, exclude=before),
+            # Prefix-sum differences carry float noise; amounts are currency, so cents
+            'amount': {status: round(float(value), 2) for status, value in totals['amount'].items()},
+        }
+    return report
+
+
+def format_breakdown(values: Dict[str, float], has_status: bool = True, currency: str = '') -> str:
+    fmt = (lambda v: f"{currency}{v:,.0f}") if currency else (lambda v: f"{v:,}")
+    if not has_status:
+        return f"{fmt(values['total'])} total"
+    parts = ", ".join(f"{fmt(values[status])} {STATUS_LABELS[status]}" for status in STATUSES)
+    return f"{fmt(values['total'])} total ({parts})"
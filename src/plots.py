@@ -1,10 +1,86 @@
+import functools
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
 import plotly.graph_objects as go
 import plotly.express as px
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
 import pandas as pd
 
+# Built figures keyed by a fingerprint of their input aggregate and options, shared by
+# all sessions. Streamlit still serializes Plotly figures on every st.plotly_chart call;
+# the cache saves rebuilding and validating them.
+FIGURE_CACHE_SIZE = 256
+# Daily cohort heatmaps hold megabytes each, so the cache is capped in bytes as well
+FIGURE_CACHE_BYTES = 64 * 1024 * 1024
+# Layout and trace objects of even the smallest figure
+FIGURE_OVERHEAD_BYTES = 64 * 1024
+_figure_cache: 'OrderedDict[str, Tuple[object, int]]' = OrderedDict()
+_figure_cache_bytes = 0
+_figure_cache_lock = threading.Lock()
+
+
+def fingerprint(*parts) -> str:
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series, pd.Index)):
+            names = list(part.columns) if isinstance(part, pd.DataFrame) else part.name
+            digest.update(repr((type(part).__name__, names, part.shape)).encode())
+            digest.update(pd.util.hash_pandas_object(part, index=not isinstance(part, pd.Index)).to_numpy().tobytes())
+            if isinstance(part, pd.DataFrame):
+                digest.update(pd.util.hash_pandas_object(part.columns.to_series(), index=False).to_numpy().tobytes())
+        elif isinstance(part, np.ndarray):
+            digest.update(repr((part.dtype.str, part.shape)).encode())
+            digest.update(np.ascontiguousarray(part).tobytes())
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+def figure_nbytes(*parts) -> int:
+    # A built figure keeps its own copy of every input array, plus a fixed overhead
+    size = FIGURE_OVERHEAD_BYTES
+    for part in parts:
+        if isinstance(part, pd.DataFrame):
+            size += int(part.memory_usage(deep=True).sum())
+        elif isinstance(part, (pd.Series, pd.Index)):
+            size += int(part.memory_usage(deep=True))
+        elif isinstance(part, np.ndarray):
+            size += part.nbytes
+        elif isinstance(part, (list, tuple)):
+            size += sum(sys.getsizeof(item) for item in part)
+    return size
+
+
+def cache_figure(builder):
+    # Memoize a plot function on a fingerprint of its arguments (LRU, thread-safe,
+    # bounded by FIGURE_CACHE_SIZE figures and FIGURE_CACHE_BYTES)
+    @functools.wraps(builder)
+    def cached(*args, **kwargs):
+        global _figure_cache_bytes
+        key = fingerprint(builder.__name__, *args, *sorted(kwargs.items()))
+        with _figure_cache_lock:
+            if key in _figure_cache:
+                _figure_cache.move_to_end(key)
+                return _figure_cache[key][0]
+        figure = builder(*args, **kwargs)
+        size = figure_nbytes(*args, *kwargs.values())
+        with _figure_cache_lock:
+            if key not in _figure_cache:
+                _figure_cache[key] = (figure, size)
+                _figure_cache_bytes += size
+            while _figure_cache and (len(_figure_cache) > FIGURE_CACHE_SIZE or _figure_cache_bytes > FIGURE_CACHE_BYTES):
+                _, (_, evicted) = _figure_cache.popitem(last=False)
+                _figure_cache_bytes -= evicted
+        return figure
+    return cached
+
+
+@cache_figure
 def plot_combined_by_channel(pivoted, country_name):
     fig = go.Figure()
     for channel in pivoted.columns:
@@ -24,6 +100,7 @@ def plot_combined_by_channel(pivoted, country_name):
     )
     return fig
 
+@cache_figure
 def plot_customers_with_new_and_total(combined, country_name):
     fig = go.Figure()
     fig.add_trace(go.Scatter(
@@ -51,8 +128,8 @@ def plot_customers_with_new_and_total(combined, country_name):
     )
     return fig
 
+@cache_figure
 def plot_pie(labels, values, title):
-    import plotly.graph_objects as go
     fig = go.Figure(data=[go.Pie(
         labels=labels,
         values=values,
@@ -69,13 +146,45 @@ def plot_pie(labels, values, title):
     )
     return fig
 
-def plot_cohort_heatmap(retention, cohort_labels, country_name):
-    plt.figure(figsize=(16, 10))
-    plt.title(f'Month-over-Month Retention Rate - {country_name}', fontsize=16)
-    sns.heatmap(retention, annot=True, fmt='.1f', cmap='YlGnBu',
-                vmin=0, vmax=100, cbar_kws={'label': 'Retention %'})
-    plt.xlabel('Cohort Index (Months Since First Transfer)', fontsize=12)
-    plt.ylabel('Cohort Month (First Transfer Month)', fontsize=12)
-    plt.yticks(ticks=np.arange(len(cohort_labels)) + 0.5, labels=cohort_labels, rotation=0)
-    plt.tight_layout()
-    return plt 
\ No newline at end of file
+@cache_figure
+def plot_status_bar(status_monthly, value_col, title, yaxis_title):
+    fig = px.bar(
+        status_monthly,
+        x='transaction_month',
+        y=value_col,
+        color='status',
+        barmode='stack',
+        title=title
+    )
+    fig.update_layout(
+        xaxis_title="Month",
+        yaxis_title=yaxis_title,
+        hovermode='x unified'
+    )
+    return fig
+
+@cache_figure
+def plot_cohort_heatmap(retention, cohort_labels, country_name, period_name='Month', metric_name='Customers'):
+    # Native Plotly heatmap straight from the retention array; empty cells stay blank
+    title = f'{period_name}-over-{period_name} Retention Rate - {country_name}'
+    fig = go.Figure(data=go.Heatmap(
+        z=retention.to_numpy(),
+        x=[str(index) for index in retention.columns],
+        y=cohort_labels,
+        zmin=0,
+        zmax=100,
+        colorscale='YlGnBu',
+        colorbar=dict(title='Retention %'),
+        # Cell labels only stay readable on small matrices (e.g. monthly cohorts)
+        texttemplate='%{z:.1f}' if retention.size <= 600 else None,
+        hovertemplate=f'Cohort: %{{y}}<br>{period_name}s since first transfer: %{{x}}<br>Retention: %{{z:.1f}}%<extra></extra>'
+    ))
+    fig.update_layout(
+        title=title if metric_name == 'Customers' else f'{title} ({metric_name})',
+        xaxis_title=f'Cohort Index ({period_name}s Since First Transfer)',
+        yaxis_title=f'Cohort {period_name} (First Transfer {period_name})',
+        yaxis=dict(autorange='reversed', type='category'),
+        xaxis=dict(type='category'),
+        height=max(500, min(1200, 22 * len(cohort_labels)))
+    )
+    return fig
@@ -0,0 +1,40 @@
+import pandas as pd
+
+from src.data_loader import canonical_promo_codes
+from src.kpi import normalize_status
+from src.sampling import row_weights, weighted_counts
+
+
+def promo_analytics(df: pd.DataFrame) -> pd.DataFrame:
+    # Usage, reach, acquisition, value and completion for every promo code in one grouped pass
+    promo = df['promoCode_clean'] if 'promoCode_clean' in df.columns else pd.Series(canonical_promo_codes(df['promoCode']), index=df.index)
+    valid = promo.notna()
+    data = df.loc[valid, ['customer_id', 'sample_weight'] if 'sample_weight' in df.columns else ['customer_id']].assign(promo=promo[valid])
+    # A new-customer acquisition is a customer's first paid transaction carrying the code
+    if 'nbTransactionsPaid' in df.columns:
+        is_new = df.loc[valid, 'nbTransactionsPaid'] == 1
+    else:
+        first_dates = df.groupby('customer_id')['transaction_date'].transform('min')
+        is_new = (df['transaction_date'] == first_dates)[valid]
+    data['new_customer'] = data['customer_id'].where(is_new)
+    data['amount'] = df.loc[valid, 'amountToSend'] if 'amountToSend' in df.columns else 0.0
+    if 'status' in df.columns:
+        data['complete'] = (normalize_status(df.loc[valid, 'status']) == 'complete').astype(float)
+    else:
+        data['complete'] = float('nan')
+    # Sample rows carry their customer's weight, so every column estimates the full data
+    weights = row_weights(data)
+    weighted = data[['amount', 'complete']].mul(weights, axis=0).assign(weight=weights.where(data['complete'].notna()))
+    sums = weighted.groupby(data['promo'], observed=True).sum(min_count=1)
+    stats = pd.DataFrame({
+        'usage': weighted_counts(data, 'promo'),
+        'customers': weighted_counts(data, 'promo', 'customer_id'),
+        'new_customers': weighted_counts(data, 'promo', 'new_customer'),
+        'amount': sums['amount'].fillna(0.0),
+        'completion': sums['complete'] / sums['weight'],
+    })
+    stats['new_customers'] = stats['new_customers'].fillna(0).astype(int)
+    stats['completion'] = (stats['completion'] * 100).round(1)
+    stats = stats.sort_values('usage', ascending=False, kind='stable').reset_index()
+    stats.columns = ['Promo Code', 'Usage Count', 'Unique Customers', 'New Customers', 'Total Amount', 'Completion Rate (%)']
+    return stats
@@ -0,0 +1,278 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.shared import load_shared, publish_shared
+
+# Sessions only ever get shallow copies of the shared frame; with copy-on-write
+# any column they add or modify is copied on write instead of touching the shared data.
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+DEFAULT_MAX_BYTES = int(os.environ.get('EASY_DASHBOARD_CACHE_MB', '4096')) * 1024 * 1024
+SESSION_TTL_SECONDS = 3600
+# Per-filter indexes kept on one dataset; the least recently used go first
+MAX_FILTER_INDEXES = int(os.environ.get('EASY_DASHBOARD_FILTER_INDEXES', '64'))
+# Per-filter indexes read this recently are what a session is rendering right now;
+# the budget leaves them alone so a rerun never rebuilds what it just built
+RECENT_INDEX_SECONDS = 30
+
+
+def _combine_digests(digests: Sequence[str]) -> str:
+    # Several files: one file keeps its own key, otherwise hash the sorted per-file
+    # hashes so the upload order does not matter
+    digests = sorted(digests)
+    if len(digests) == 1:
+        return digests[0]
+    return hashlib.sha256(''.join(digests).encode()).hexdigest()
+
+
+def dataset_key(data: Union[bytes, Sequence[bytes]]) -> str:
+    if isinstance(data, bytes):
+        return hashlib.sha256(data).hexdigest()
+    return _combine_digests([dataset_key(blob) for blob in data])
+
+
+def file_dataset_key(path: Union[str, Sequence[str]]) -> str:
+    # dataset_key of the files' bytes, hashed without holding them in memory
+    if not isinstance(path, str):
+        return _combine_digests([file_dataset_key(one) for one in path])
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def object_nbytes(obj: Any) -> int:
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True, index=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True, index=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, (tuple, list)):
+        return sum(object_nbytes(item) for item in obj)
+    if isinstance(obj, dict):
+        return sum(object_nbytes(item) for item in obj.values())
+    return int(getattr(obj, 'nbytes', 0))
+
+
+class DatasetEntry:
+    def __init__(self, key: str, df: pd.DataFrame, parent: Optional['DatasetEntry'] = None):
+        self.key = key
+        self.df = df
+        # An entry over a frame derived from another entry's (e.g. a customer sample)
+        # keeps its indexes in the parent, so they count against the parent's budget
+        self.parent = parent
+        self.indexes: Dict[Any, Any] = {}
+        self.sessions: Dict[str, float] = {}
+        self.nbytes = object_nbytes(df) if parent is None else 0
+        self._lock = threading.Lock()
+        self._index_locks: Dict[Any, threading.Lock] = {}
+        self._on_grow: Optional[Callable[[], None]] = None
+        # Per-filter indexes in least recently used order, with their size and last use
+        self._evictable: 'OrderedDict[Any, Tuple[int, float]]' = OrderedDict()
+
+    def frame(self) -> pd.DataFrame:
+        # Read-only reference: shares every column buffer with the cached frame
+        return self.df.copy(deep=False)
+
+    def peek(self, name: Any) -> Any:
+        if self.parent is not None:
+            return self.parent.peek((self.key, name))
+        value = self.indexes.get(name)
+        if value is not None:
+            self._touch_index(name)
+        return value
+
+    def index(self, name: Any, builder: Callable[[], Any], evictable: bool = False) -> Any:
+        # Derived indexes are built once per dataset, even when several sessions ask at once.
+        # Indexes for one filter (date range, country) are evictable: at most
+        # MAX_FILTER_INDEXES of them are kept, and the memory budget may drop them.
+        if self.parent is not None:
+            return self.parent.index((self.key, name), builder, evictable)
+        value = self.peek(name)
+        if value is not None:
+            return value
+        with self._lock:
+            name_lock = self._index_locks.setdefault(name, threading.Lock())
+        with name_lock:
+            value = self.indexes.get(name)
+            if value is None:
+                value = builder()
+                size = object_nbytes(value)
+                with self._lock:
+                    self.indexes[name] = value
+                    self.nbytes += size
+                    if evictable:
+                        self._evictable[name] = (size, time.time())
+                        while len(self._evictable) > MAX_FILTER_INDEXES:
+                            self._drop_index(next(iter(self._evictable)))
+                if self._on_grow is not None:
+                    self._on_grow()
+        with self._lock:
+            self._index_locks.pop(name, None)
+        return value
+
+    def _touch_index(self, name: Any) -> None:
+        with self._lock:
+            if name in self._evictable:
+                self._evictable[name] = (self._evictable[name][0], time.time())
+                self._evictable.move_to_end(name)
+
+    def _drop_index(self, name: Any) -> int:
+        # Caller holds self._lock; sessions still holding the object keep it alive
+        size, _ = self._evictable.pop(name)
+        self.indexes.pop(name, None)
+        self.nbytes -= size
+        return size
+
+    def evict_indexes(self, target: int, now: float) -> int:
+        # Drop least recently used per-filter indexes until `target` bytes are freed;
+        # returns the bytes freed
+        freed = 0
+        with self._lock:
+            for name, (_, used) in list(self._evictable.items()):
+                if freed >= target or now - used < RECENT_INDEX_SECONDS:
+                    break
+                freed += self._drop_index(name)
+        return freed
+
+    def in_use(self, now: float) -> bool:
+        return any(now - seen < SESSION_TTL_SECONDS for seen in self.sessions.values())
+
+
+class DatasetRegistry:
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.shared_loads = 0
+        self._entries: 'OrderedDict[str, DatasetEntry]' = OrderedDict()
+        self._lock = threading.RLock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    def get(self, key: str, session_id: Optional[str] = None) -> Optional[DatasetEntry]:
+        entry = self._lookup(key, session_id) or self._attach_shared(key, session_id)
+        if entry is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return entry
+
+    def get_or_load(self, key: str, loader: Callable[[], pd.DataFrame], session_id: Optional[str] = None) -> DatasetEntry:
+        entry = self._lookup(key, session_id)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            # Another session may have finished loading the same file while we waited
+            entry = self._lookup(key, session_id)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            entry = self._attach_shared(key, session_id)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            df = loader()
+            publish_shared(key, df)
+            entry = self.put(key, df, session_id)
+        with self._lock:
+            self._load_locks.pop(key, None)
+        return entry
+
+    def _lookup(self, key: str, session_id: Optional[str]) -> Optional[DatasetEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._touch(entry, session_id)
+            return entry
+
+    def _attach_shared(self, key: str, session_id: Optional[str]) -> Optional[DatasetEntry]:
+        # Another server process may already have published this dataset
+        shared = load_shared(key)
+        if shared is None:
+            return None
+        df, indexes = shared
+        self.shared_loads += 1
+        return self.put(key, df, session_id, indexes)
+
+    def put(self, key: str, df: pd.DataFrame, session_id: Optional[str] = None,
+            indexes: Optional[Dict[Any, Any]] = None) -> DatasetEntry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = DatasetEntry(key, df)
+                for name, value in (indexes or {}).items():
+                    entry.indexes[name] = value
+                    entry.nbytes += object_nbytes(value)
+                entry._on_grow = self._enforce_budget
+                self._entries[key] = entry
+            self._touch(entry, session_id)
+        self._enforce_budget()
+        return entry
+
+    def release(self, session_id: str, keep: Optional[str] = None) -> None:
+        with self._lock:
+            for key, entry in self._entries.items():
+                if key != keep:
+                    entry.sessions.pop(session_id, None)
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.nbytes for entry in self._entries.values())
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            now = time.time()
+            return {
+                'datasets': len(self._entries),
+                'in_use': sum(entry.in_use(now) for entry in self._entries.values()),
+                'bytes': self.total_bytes(),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'shared_loads': self.shared_loads,
+            }
+
+    def _touch(self, entry: DatasetEntry, session_id: Optional[str]) -> None:
+        self._entries.move_to_end(entry.key)
+        if session_id is not None:
+            entry.sessions[session_id] = time.time()
+            self.release(session_id, keep=entry.key)
+
+    def _enforce_budget(self) -> None:
+        # Evict least recently used datasets that no live session is looking at, then
+        # the least recently used per-filter indexes of the datasets still in use
+        with self._lock:
+            now = time.time()
+            total = self.total_bytes()
+            for key in list(self._entries):
+                if total <= self.max_bytes:
+                    break
+                entry = self._entries[key]
+                if entry.in_use(now):
+                    continue
+                del self._entries[key]
+                total -= entry.nbytes
+                self.evictions += 1
+            for entry in list(self._entries.values()):
+                if total <= self.max_bytes:
+                    break
+                total -= entry.evict_indexes(total - self.max_bytes, now)
+
+
+registry = DatasetRegistry()
@@ -0,0 +1,262 @@
+import datetime as dt
+import hashlib
+import html
+import json
+import os
+import re
+from typing import List, Optional
+
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+from src.bitmaps import CustomerBitmapIndex
+from src.cohort import CohortEngine
+from src.comparison import CityMonthMatrix
+from src.data_loader import filter_data
+from src.kpi import KpiEngine, format_breakdown, kpi_report
+from src.plots import plot_combined_by_channel, plot_customers_with_new_and_total, plot_pie, plot_status_bar, plot_cohort_heatmap
+from src.promo import promo_analytics
+from src.registry import DatasetEntry
+from src.rfm import compute_rfm
+from src.sketches import SketchIndex
+from src.summary import monthly_summaries
+from src.utils import group_top_n_with_other_batch
+
+# Bump when the report layout changes, so existing reports are rebuilt
+REPORT_VERSION = 1
+COUNTRY_NAMES = {None: 'All', 'TUN': 'Tunisia', 'MAC': 'Morocco'}
+_STAMP = re.compile(rb'<meta name="easy-dashboard-report" content="([0-9a-f]+)">')
+
+STYLE = """
+body { font-family: -apple-system, "Segoe UI", Roboto, sans-serif; margin: 0 auto; max-width: 1200px; padding: 16px; color: #262730; }
+h2 { border-bottom: 1px solid #e6e6e6; padding-bottom: 4px; margin-top: 40px; }
+.cards { display: grid; grid-template-columns: repeat(auto-fit, minmax(320px, 1fr)); gap: 12px; }
+.card { background: #f8f9ff; padding: 12px 15px; border-radius: 8px; box-shadow: 0 2px 8px rgba(0,0,0,0.08); border-left: 4px solid #4CAF50; }
+.card h5 { margin: 0; color: #555; font-size: 13px; }
+.card p { margin: 4px 0 0 0; font-weight: 700; }
+table { border-collapse: collapse; font-size: 13px; margin: 8px 0; }
+th, td { border: 1px solid #e6e6e6; padding: 3px 8px; text-align: right; }
+.chart { min-height: 420px; }
+.caption { color: #808495; font-size: 12px; }
+"""
+
+# Draw every embedded figure; the month comparison swaps figures on selection
+SCRIPT = """
+document.querySelectorAll('script[data-figure]').forEach(function (node) {
+  var figure = JSON.parse(node.textContent);
+  Plotly.newPlot(node.dataset.figure, figure.data, figure.layout, {responsive: true});
+});
+var months = JSON.parse(document.getElementById('compare-data').textContent);
+var picker = document.getElementById('compare-month');
+function showMonth() {
+  var figures = months[picker.value] || [];
+  figures.forEach(function (figure, i) {
+    Plotly.react('compare-' + i, figure.data, figure.layout, {responsive: true});
+  });
+}
+if (picker) { picker.addEventListener('change', showMonth); showMonth(); }
+"""
+
+
+def report_stamp(dataset_version: str, country: Optional[str], start: dt.date, end: dt.date) -> str:
+    # Identifies the inputs of a report: same stamp, same HTML
+    return hashlib.sha1(repr((REPORT_VERSION, dataset_version, country, start, end)).encode()).hexdigest()
+
+
+def existing_stamp(path: str) -> Optional[str]:
+    # The stamp sits in <head>, so the first few KB are enough
+    try:
+        with open(path, 'rb') as handle:
+            match = _STAMP.search(handle.read(8192))
+    except OSError:
+        return None
+    return match.group(1).decode() if match else None
+
+
+def _json(payload) -> str:
+    # Safe inside a <script> element
+    return payload.replace('</', '<\\/')
+
+
+class ReportBuilder:
+    def __init__(self):
+        self.sections: List[str] = []
+        self.n_figures = 0
+
+    def section(self, title: str) -> None:
+        self.sections.append(f"<h2>{html.escape(title)}</h2>")
+
+    def text(self, markup: str) -> None:
+        self.sections.append(markup)
+
+    def figure(self, fig) -> None:
+        # Data-only figure JSON; one shared copy of plotly.js draws them all
+        div = f"fig-{self.n_figures}"
+        self.n_figures += 1
+        self.sections.append(
+            f'<div id="{div}" class="chart"></div>'
+            f'<script type="application/json" data-figure="{div}">{_json(pio.to_json(fig, validate=False))}</script>'
+        )
+
+    def table(self, frame: pd.DataFrame, index: bool = False) -> None:
+        self.sections.append(frame.to_html(index=index, border=0, float_format=lambda v: f"{v:,.2f}"))
+
+    def render(self, title: str, stamp: str, compare: dict) -> str:
+        return "\n".join([
+            "<!DOCTYPE html>",
+            "<html><head><meta charset=\"utf-8\">",
+            f'<meta name="easy-dashboard-report" content="{stamp}">',
+            f"<title>{html.escape(title)}</title><style>{STYLE}</style>",
+            f"<script>{get_plotlyjs()}</script>",
+            "</head><body>",
+            f"<h1>{html.escape(title)}</h1>",
+            *self.sections,
+            f'<script type="application/json" id="compare-data">{_json(json.dumps(compare))}</script>',
+            f"<script>{SCRIPT}</script>",
+            "</body></html>",
+        ])
+
+
+def build_report(entry: DatasetEntry, country: Optional[str], start: dt.date, end: dt.date, generated: Optional[str] = None) -> str:
+    # Every tab of the dashboard for one filter, computed once and rendered as static HTML
+    df = entry.frame()
+    country_name = COUNTRY_NAMES.get(country, country)
+    df_filtered = filter_data(df, dt.datetime.combine(start, dt.time()), dt.datetime.combine(end, dt.time(23, 59, 59)), country)
+    filter_key = (country, start, end)
+    stamp = report_stamp(entry.key, country, start, end)
+    title = f"Easy Dashboard – {country_name}, {start:%b %d, %Y} – {end:%b %d, %Y}"
+    report = ReportBuilder()
+    report.text(f'<p class="caption">Dataset {entry.key[:12]} · generated {html.escape(generated or dt.datetime.now().strftime("%Y-%m-%d %H:%M"))}</p>')
+    if df_filtered.empty:
+        report.text("<p>No transactions in the selected date range and country.</p>")
+        return report.render(title, stamp, {})
+
+    # KPI cards
+    engine = entry.index(('kpi', country), lambda: KpiEngine(df if country is None else df[df['country'] == country]))
+    customer_index = entry.index(('customer_bitmaps',), lambda: CustomerBitmapIndex(df))
+    kpis = kpi_report(engine, customer_index, start, end, country)
+    report.section("📊 Key Performance Indicators")
+    cards = []
+    for name, label in [('today', "Today"), ('this_month', "This Month")]:
+        window = kpis.get(name)
+        if window is None:
+            continue
+        for metric, metric_label, currency in [
+            ('transactions', "🛒 Transactions", ''),
+            ('active_customers', "👥 Active customers", ''),
+            ('new_customers', "🆕 New customers", ''),
+            ('amount', "💰 Amount", '€'),
+        ]:
+            value = format_breakdown(window[metric], engine.has_status, currency=currency)
+            cards.append(f'<div class="card"><h5>{label} ({window["start"]} – {window["end"]}) · {metric_label}</h5><p>{html.escape(value)}</p></div>')
+    report.text(f'<div class="cards">{"".join(cards)}</div>')
+
+    # Monthly Summary
+    report.section("Monthly Summary")
+    grouped, combined = entry.index(('monthly',) + filter_key, lambda: monthly_summaries(df_filtered), evictable=True)
+    if 'status' in df_filtered.columns:
+        status_monthly = df_filtered.groupby(['transaction_month', 'status']).size().reset_index(name='Total Transactions')
+        status_monthly['status'] = status_monthly['status'].replace({'canceled': 'cancelled'})
+        report.figure(plot_status_bar(status_monthly, 'Total Transactions', "Monthly Transactions by Status (Stacked Bar)", "Number of Transactions"))
+    pivoted = grouped.pivot(index='transaction_month', columns='distributionChannel', values='Total Transactions').fillna(0)
+    report.figure(plot_combined_by_channel(pivoted, country_name))
+
+    # Customers
+    report.section("Customers")
+    if 'status' in df_filtered.columns:
+        customer_status_monthly = df_filtered.groupby(['transaction_month', 'status'])['customer_id'].nunique().reset_index(name='Unique Customers')
+        customer_status_monthly['status'] = customer_status_monthly['status'].replace({'canceled': 'cancelled'})
+        report.figure(plot_status_bar(customer_status_monthly, 'Unique Customers', "Monthly Unique Customers by Status (Stacked Bar)", "Number of Unique Customers"))
+    report.figure(plot_customers_with_new_and_total(combined, country_name))
+
+    # Cohort Analysis
+    report.section("Cohort Analysis")
+    cohort_engine = entry.index(('cohort',) + filter_key, lambda: CohortEngine(df_filtered), evictable=True)
+    retention, cohort_labels = cohort_engine.retention('customers')
+    if not retention.empty:
+        report.figure(plot_cohort_heatmap(retention, cohort_labels, country_name))
+
+    # Breakdowns, whole period
+    report.section("Breakdowns")
+    pies = [
+        ('country_tx', df_filtered['country'].value_counts(), 'Total Transactions by Country'),
+        ('country_cust', df_filtered.groupby('country')['customer_id'].nunique(), 'Unique Customers by Country'),
+    ]
+    long = pd.concat([counts.rename_axis('label').reset_index(name='value').assign(pie=key) for key, counts, _ in pies], ignore_index=True)
+    pie_data, _ = group_top_n_with_other_batch(long, 'pie', 'value', label_col='label', top_n=10)
+    for key, _, pie_title in pies:
+        pie_df = pie_data[pie_data['pie'] == key]
+        report.figure(plot_pie(pie_df['label'], pie_df['value'], pie_title))
+    sketches = entry.index(('sketches',), lambda: SketchIndex(df))
+    for column, pie_title in [('reason', "Reasons for Money Transfers"), ('network', 'Network Usage'), ('gov', 'Transaction Distribution by Governorate')]:
+        if column in df_filtered.columns:
+            pie_df, caption = sketches.top_with_other(column, start, end, country, df_filtered, k=10)
+            report.figure(plot_pie(pie_df['label'], pie_df['value'], pie_title))
+            report.text(f'<p class="caption">{html.escape(caption)}</p>')
+
+    # Cities and Month Comparison share the city x month matrix
+    compare = {}
+    if 'ville' in df_filtered.columns:
+        city_month_all = entry.index(('city_month', country), lambda: CityMonthMatrix(df if country is None else df[df['country'] == country]))
+        city_month = entry.index(('city_month_window',) + filter_key, lambda: city_month_all.window(start, end, df_filtered), evictable=True)
+        report.section("Cities")
+        cities = df_filtered.groupby('ville').agg(Transactions=('customer_id', 'size'), Active_Customers=('customer_id', 'nunique'))
+        cities = cities.sort_values('Transactions', ascending=False).head(20)
+        if 'gov' in df_filtered.columns:
+            cities.insert(0, 'gov', df_filtered.groupby('ville')['gov'].first().reindex(cities.index))
+        report.table(cities, index=True)
+        top_cities = cities.index[:8]
+        city_series = df_filtered[df_filtered['ville'].isin(top_cities)].groupby(['transaction_month', 'ville']).size().reset_index(name='Transactions')
+        report.figure(px.line(city_series, x='transaction_month', y='Transactions', color='ville', title="Transactions Over Time - Top 8 Cities"))
+
+        report.section("Month Comparison")
+        months = city_month.month_labels()
+        metric_labels = {'Transactions': "Transactions", 'Unique_Customers': "Unique Customers"}
+        month_pies, _ = group_top_n_with_other_batch(city_month.long_frame(months, list(metric_labels)), 'pie', 'value', top_n=8)
+        groups = dict(tuple(month_pies.groupby('pie', sort=False)))
+        for month in months:
+            compare[month] = []
+            for metric, metric_label in metric_labels.items():
+                city_data = groups.get(f"{metric}_{month}", month_pies.iloc[:0])
+                fig = plot_pie(city_data['ville'], city_data['value'], f"{metric_label} by City - {month}")
+                compare[month].append(json.loads(pio.to_json(fig, validate=False)))
+        options = "".join(f'<option value="{month}"{" selected" if month == months[-1] else ""}>{month}</option>' for month in months)
+        report.text(f'<label>Month <select id="compare-month">{options}</select></label>')
+        report.text("".join(f'<div id="compare-{i}" class="chart"></div>' for i in range(len(metric_labels))))
+        for metric, metric_label in metric_labels.items():
+            report.text(f"<h4>{metric_label} by City</h4>")
+            report.table(city_month.compare(months, metric).sort_values(months[-1], ascending=False).head(20), index=True)
+
+    # Promo Codes
+    if 'promoCode' in df_filtered.columns:
+        report.section("Promo Codes")
+        promo_stats = entry.index(('promo',) + filter_key, lambda: promo_analytics(df_filtered), evictable=True)
+        if promo_stats.empty:
+            report.text("<p>No valid promo codes found.</p>")
+        else:
+            report.table(promo_stats)
+            promo_counts, promo_caption = sketches.top_with_other('promoCode', start, end, country, df_filtered, k=10)
+            report.figure(plot_pie(promo_counts['label'], promo_counts['value'], f"Promo Code Usage - {country_name}"))
+            report.text(f'<p class="caption">{html.escape(promo_caption)}</p>')
+
+    # RFM Segmentation
+    report.section("RFM Segmentation")
+    rfm = entry.index(('rfm',) + filter_key, lambda: compute_rfm(df_filtered), evictable=True)
+    segment_counts = rfm['segment'].value_counts().rename_axis('segment').reset_index(name='count')
+    fig = px.bar(segment_counts, x='segment', y='count', color='segment', text='count',
+                 labels={'segment': 'Segment', 'count': 'Number of Customers'}, title='Customer Distribution by RFM Segment')
+    fig.update_traces(texttemplate='%{text}', textposition='outside')
+    report.figure(fig)
+    report.table(rfm.head(10))
+
+    return report.render(title, stamp, compare)
+
+
+def write_report(entry: DatasetEntry, path: str, country: Optional[str], start: dt.date, end: dt.date) -> None:
+    staging = f"{path}.tmp-{os.getpid()}"
+    with open(staging, 'w', encoding='utf-8') as handle:
+        handle.write(build_report(entry, country, start, end))
+    # Viewers never see a half-written file
+    os.replace(staging, path)
@@ -0,0 +1,34 @@
+import pandas as pd
+import numpy as np
+
+from src.sampling import with_customer_weights
+
+def compute_rfm(df: pd.DataFrame) -> pd.DataFrame:
+    # Reference date: day after last transaction
+    reference_date = df['transaction_date'].max() + pd.Timedelta(days=1)
+    grouped = df.groupby('customer_id')
+    rfm = pd.DataFrame({
+        'recency': (reference_date - grouped['transaction_date'].max()).dt.days,  # Recency
+        'frequency': grouped['_id'].count(),                                      # Frequency
+        'monetary': grouped['amountToSend'].sum()                                 # Monetary
+    }).reset_index()
+    rfm['R_score'] = pd.qcut(rfm['recency'], 5, labels=[5, 4, 3, 2, 1]).astype(int)
+    rfm['F_score'] = pd.qcut(rfm['frequency'].rank(method='first'), 5, labels=[1, 2, 3, 4, 5]).astype(int)
+    rfm['M_score'] = pd.qcut(rfm['monetary'], 5, labels=[1, 2, 3, 4, 5]).astype(int)
+    rfm['RFM_score'] = rfm['R_score'].astype(str) + rfm['F_score'].astype(str) + rfm['M_score'].astype(str)
+    rfm['segment'] = rfm_segments(rfm)
+    return with_customer_weights(rfm, df)
+
+def rfm_segments(rfm: pd.DataFrame) -> np.ndarray:
+    # First matching rule wins, same order as the segment descriptions in the RFM tab
+    r, f, m = rfm['R_score'], rfm['F_score'], rfm['M_score']
+    conditions = [
+        (r >= 4) & (f >= 4) & (m >= 4),
+        (f >= 4) & (r >= 3),
+        r >= 4,
+        f >= 4,
+        m >= 4,
+        (r <= 2) & (f <= 2),
+    ]
+    choices = ['Champions', 'Loyal', 'Recent', 'Frequent', 'Big Spenders', 'Dormant']
+    return np.select(conditions, choices, default='Others')
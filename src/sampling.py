@@ -0,0 +1,115 @@
+import math
+import os
+from typing import Iterable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.registry import DatasetEntry, object_nbytes
+
+SAMPLE_RATE = float(os.environ.get('EASY_DASHBOARD_SAMPLE_RATE', '0.1'))
+# Sampling mode starts switched on for datasets at least this large
+SAMPLE_AUTO_ROWS = int(os.environ.get('EASY_DASHBOARD_SAMPLE_AUTO_ROWS', '5000000'))
+MIN_PER_STRATUM = 20
+Z_95 = 1.96
+
+
+class CustomerSample:
+    # Stratified sample of whole customers: strata are (country, month of first
+    # transaction) and within each stratum the customers with the lowest id hash
+    # are kept, so the sample is stable across reruns and processes. Every row of a
+    # sampled customer is kept with weight N_h / n_h; whole histories make cohort
+    # retention and RFM unbiased, and the weights rescale counts back to the full data.
+    def __init__(self, df: pd.DataFrame, parent: DatasetEntry, rate: float = SAMPLE_RATE, min_per_stratum: int = MIN_PER_STRATUM):
+        self.rate = rate
+        codes, customer_ids = pd.factorize(df['customer_id'])
+        # Position of every customer's first transaction, in customer code order
+        positions = np.flatnonzero(codes >= 0)
+        positions = positions[np.lexsort((df['transaction_date'].to_numpy()[positions], codes[positions]))]
+        first_rows = df.iloc[positions[np.r_[True, codes[positions][1:] != codes[positions][:-1]]]]
+        countries = first_rows['country'].astype(str) if 'country' in first_rows.columns else pd.Series('All', index=first_rows.index)
+        strata, _ = pd.MultiIndex.from_arrays([
+            countries.to_numpy(),
+            first_rows['transaction_date'].dt.to_period('M').astype(str).to_numpy(),
+        ]).factorize()
+        self.population = np.bincount(strata)
+        self.sampled = np.minimum(self.population, np.maximum(min_per_stratum, np.ceil(rate * self.population))).astype(np.int64)
+
+        # Rank customers by id hash inside their stratum and keep the first n_h
+        hashes = pd.util.hash_pandas_object(pd.Series(customer_ids), index=False).to_numpy()
+        order = np.lexsort((hashes, strata))
+        stratum_start = np.r_[0, np.cumsum(self.population)[:-1]]
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order)) - stratum_start[strata[order]]
+        keep = rank < self.sampled[strata]
+
+        # Compact codes for the kept customers, and each kept customer's stratum
+        compact = np.full(len(keep), -1, dtype=np.int64)
+        compact[keep] = np.arange(int(keep.sum()))
+        self.customer_stratum = strata[keep]
+        self.customer_weight = (self.population / self.sampled)[self.customer_stratum]
+        rows = np.flatnonzero((codes >= 0) & keep[np.maximum(codes, 0)])
+        self.row_customer = compact[codes[rows]]
+        self.frame = df.iloc[rows].reset_index(drop=True).assign(sample_weight=self.customer_weight[self.row_customer])
+        self.rows_total = len(df)
+        # Separate key so indexes built on the sample never mix with the full data; they
+        # are stored in the parent entry and count against the registry budget there
+        self.entry = DatasetEntry(f"{parent.key}:sample", self.frame, parent)
+
+    @property
+    def nbytes(self) -> int:
+        return object_nbytes(self.frame) + self.row_customer.nbytes + self.customer_weight.nbytes
+
+    def estimate(self, rows: Iterable[int], values: Optional[np.ndarray] = None, distinct: bool = False) -> Tuple[float, float]:
+        # Stratified estimate of a total over the given sample rows (count, sum of
+        # values, or distinct customers) with its 95% confidence half-width
+        rows = np.asarray(rows, dtype=np.int64)
+        customers = self.row_customer[rows]
+        n_customers = len(self.customer_stratum)
+        if distinct:
+            y = (np.bincount(customers, minlength=n_customers) > 0).astype(np.float64)
+        else:
+            y = np.bincount(customers, weights=values, minlength=n_customers).astype(np.float64)
+        n_strata = len(self.population)
+        totals = np.bincount(self.customer_stratum, weights=y, minlength=n_strata)
+        squares = np.bincount(self.customer_stratum, weights=y * y, minlength=n_strata)
+        n, N = self.sampled.astype(np.float64), self.population.astype(np.float64)
+        means = totals / n
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variances = np.where(n > 1, (squares - n * means ** 2) / (n - 1), 0.0)
+        variance = float(np.sum(N ** 2 * (1 - n / N) * np.maximum(variances, 0) / n))
+        return float(np.sum(N * means)), Z_95 * math.sqrt(variance)
+
+
+def row_weights(df: pd.DataFrame) -> pd.Series:
+    # Sample rows count with their customer's weight, full data rows once
+    if 'sample_weight' in df.columns:
+        return df['sample_weight']
+    return pd.Series(1.0, index=df.index)
+
+
+def weighted_counts(df: pd.DataFrame, by: Union[str, Sequence[str]], distinct: Optional[str] = None) -> pd.Series:
+    # Rows, or distinct values of `distinct`, per group. Sample rows count with their
+    # customer's weight, so small oversampled strata do not skew the estimate.
+    if 'sample_weight' not in df.columns:
+        grouped = df.groupby(by, observed=True)
+        return grouped.size() if distinct is None else grouped[distinct].nunique()
+    keys = [by] if isinstance(by, str) else list(by)
+    rows = df if distinct is None else df.dropna(subset=[distinct]).drop_duplicates(keys + [distinct])
+    return rows.groupby(keys, observed=True)['sample_weight'].sum().round().astype(np.int64)
+
+
+def weighted_rows(df: pd.DataFrame, distinct: Optional[str] = None) -> int:
+    # Row count (or distinct values of `distinct`) with the same weighting as weighted_counts
+    if 'sample_weight' not in df.columns:
+        return len(df) if distinct is None else int(df[distinct].nunique())
+    rows = df if distinct is None else df.dropna(subset=[distinct]).drop_duplicates(distinct)
+    return int(round(rows['sample_weight'].sum()))
+
+
+def with_customer_weights(table: pd.DataFrame, df: pd.DataFrame) -> pd.DataFrame:
+    # Carry each customer's sample weight onto a one-row-per-customer table
+    if 'sample_weight' not in df.columns:
+        return table
+    weights = df.groupby('customer_id')['sample_weight'].first()
+    return table.assign(sample_weight=table['customer_id'].map(weights).to_numpy())
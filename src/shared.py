@@ -0,0 +1,160 @@
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.kpi import KpiEngine
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow is optional; without it every process keeps its own copy
+    pa = None
+
+try:
+    import fcntl
+except ImportError:  # no advisory locks (Windows): concurrent publishers may both write
+    fcntl = None
+
+# Bump when preprocessing changes, so processes never map files written by older code
+FORMAT_VERSION = 3
+SHARED_DIR = os.environ.get('EASY_DASHBOARD_SHARED_DIR')
+
+
+def _string_dtype() -> Optional[Any]:
+    # Arrow-backed strings with NaN for missing values (pandas' `str` dtype): comparisons
+    # and masks behave like object columns, but the text stays in the mapped file
+    if pa is None:
+        return None
+    try:
+        return pd.StringDtype('pyarrow', na_value=np.nan)
+    except TypeError:
+        try:
+            return pd.StringDtype('pyarrow_numpy')  # pandas 2.1 / 2.2
+        except (TypeError, ValueError):
+            return None
+
+
+STRING_DTYPE = _string_dtype()
+
+# Layout, one directory per dataset key:
+#   <SHARED_DIR>/<key>/CURRENT              name of the live version directory
+#   <SHARED_DIR>/<key>/.lock                held while a process publishes
+#   <SHARED_DIR>/<key>/v3-<stamp>/data.arrow  Arrow IPC file of the ingested frame
+#   <SHARED_DIR>/<key>/v3-<stamp>/kpi.json + kpi.*.npy  dataset-wide KPI prefix sums
+# A version directory is complete before it is renamed into place, and CURRENT is
+# swapped with os.replace, so readers see either the old version or the new one.
+# String columns are stored as large_string, the layout of STRING_DTYPE, so they map
+# without a copy just like the numeric and datetime columns.
+
+
+def shared_enabled() -> bool:
+    return pa is not None and bool(SHARED_DIR)
+
+
+def _dataset_dir(key: str) -> str:
+    return os.path.join(SHARED_DIR, key)
+
+
+def current_version(key: str) -> Optional[str]:
+    try:
+        with open(os.path.join(_dataset_dir(key), 'CURRENT')) as handle:
+            version = handle.read().strip()
+    except OSError:
+        return None
+    if not version.startswith(f"v{FORMAT_VERSION}-"):
+        return None
+    return version if os.path.isdir(os.path.join(_dataset_dir(key), version)) else None
+
+
+def load_shared(key: str) -> Optional[Tuple[pd.DataFrame, Dict[Any, Any]]]:
+    # Memory-map the published version: numeric, datetime and string columns and the
+    # index arrays point straight into the page cache shared by every server process
+    if not shared_enabled():
+        return None
+    version = current_version(key)
+    if version is None:
+        return None
+    path = os.path.join(_dataset_dir(key), version)
+    try:
+        source = pa.memory_map(os.path.join(path, 'data.arrow'), 'r')
+    except OSError:
+        # Superseded and removed between reading CURRENT and opening it
+        return None
+    table = pa.ipc.open_file(source).read_all()
+    types_mapper = {pa.large_string(): STRING_DTYPE}.get if STRING_DTYPE is not None else None
+    df = table.to_pandas(split_blocks=True, self_destruct=False, types_mapper=types_mapper)
+    # Arrow nulls come back as None in object columns; keep NaN like read_csv does
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].where(df[col].notna(), np.nan)
+    indexes: Dict[Any, Any] = {}
+    kpi_meta = os.path.join(path, 'kpi.json')
+    if os.path.exists(kpi_meta):
+        with open(kpi_meta) as handle:
+            meta = json.load(handle)
+        arrays = {name: np.load(os.path.join(path, f"kpi.{name}.npy"), mmap_mode='r') for name in KpiEngine.ARRAYS}
+        indexes[('kpi', None)] = KpiEngine.from_arrays(meta, arrays)
+    return df, indexes
+
+
+def _remove_stale(dataset_dir: str, keep: str) -> None:
+    # Superseded versions (older formats, or a publisher that lost a race before locks)
+    # and leftovers of crashed publishers. Processes that already mapped a removed
+    # file keep their mapping; the data goes away when the last one unmaps it.
+    for name in os.listdir(dataset_dir):
+        if name in (keep, 'CURRENT', '.lock'):
+            continue
+        path = os.path.join(dataset_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def publish_shared(key: str, df: pd.DataFrame) -> Optional[str]:
+    # Write the frame and its dataset-wide indexes once; later processes just map them
+    if not shared_enabled() or current_version(key) is not None:
+        return None
+    dataset_dir = _dataset_dir(key)
+    os.makedirs(dataset_dir, exist_ok=True)
+    with open(os.path.join(dataset_dir, '.lock'), 'w') as lock:
+        # One publisher at a time; the ones waiting find the version already there
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        if current_version(key) is not None:
+            return None
+        version = _write_version(dataset_dir, df)
+        _remove_stale(dataset_dir, version)
+    return version
+
+
+def _write_version(dataset_dir: str, df: pd.DataFrame) -> str:
+    version = f"v{FORMAT_VERSION}-{time.time_ns()}-{os.getpid()}"
+    staging = os.path.join(dataset_dir, f".tmp-{version}")
+    os.makedirs(staging)
+    try:
+        strings = df.columns[df.dtypes == object] if STRING_DTYPE is not None else []
+        table = pa.Table.from_pandas(df.astype({col: STRING_DTYPE for col in strings}), preserve_index=False)
+        with pa.OSFile(os.path.join(staging, 'data.arrow'), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        meta, arrays = KpiEngine(df).to_arrays()
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, f"kpi.{name}.npy"), array)
+        with open(os.path.join(staging, 'kpi.json'), 'w') as handle:
+            json.dump(meta, handle)
+        os.replace(staging, os.path.join(dataset_dir, version))
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    pointer = os.path.join(dataset_dir, f".CURRENT-{version}")
+    with open(pointer, 'w') as handle:
+        handle.write(version)
+    os.replace(pointer, os.path.join(dataset_dir, 'CURRENT'))
+    return version
@@ -0,0 +1,181 @@
+import datetime as dt
+import heapq
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from src.sampling import row_weights
+
+SKETCH_COLUMNS = ('ville', 'network', 'reason', 'gov', 'promoCode')
+SKETCH_CAPACITY = 200
+SKETCH_CHUNK_ROWS = 200_000
+
+
+class SpaceSaving:
+    # Space-Saving heavy-hitters summary with at most `capacity` counters. Every
+    # estimate is an upper bound on the true count and overshoots by at most its
+    # recorded error, which never exceeds total / capacity. Summaries merge.
+    def __init__(self, capacity: int = SKETCH_CAPACITY):
+        self.capacity = capacity
+        self.counts: Dict[Any, float] = {}
+        self.errors: Dict[Any, float] = {}
+        self.total = 0.0
+        # Upper bound on the count of any item that is not tracked
+        self.floor = 0.0
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._seq = 0
+
+    def _push(self, item: Any) -> None:
+        self._seq += 1
+        heapq.heappush(self._heap, (self.counts[item], self._seq, item))
+
+    def _pop_min(self) -> Tuple[Any, float]:
+        # Heap entries go stale when a counter grows; skip them lazily
+        while True:
+            count, _, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == count:
+                return item, count
+
+    def update(self, item: Any, weight: float = 1) -> None:
+        self.total += weight
+        if item in self.counts:
+            self.counts[item] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = weight
+            self.errors[item] = 0.0
+        else:
+            evicted, floor = self._pop_min()
+            del self.counts[evicted], self.errors[evicted]
+            self.floor = max(self.floor, floor)
+            self.counts[item] = floor + weight
+            self.errors[item] = floor
+        self._push(item)
+
+    @classmethod
+    def from_counts(cls, counts: pd.Series, capacity: int = SKETCH_CAPACITY) -> 'SpaceSaving':
+        # Heaviest items first, so the exact ones take the counters
+        sketch = cls(capacity)
+        for item, weight in counts.sort_values(ascending=False, kind='stable').items():
+            sketch.update(item, float(weight))
+        return sketch
+
+    @classmethod
+    def merge(cls, sketches: Iterable['SpaceSaving'], capacity: Optional[int] = None) -> 'SpaceSaving':
+        # An item missing from a summary may still have up to that summary's floor there
+        sketches = list(sketches)
+        merged = cls(capacity or max((sketch.capacity for sketch in sketches), default=SKETCH_CAPACITY))
+        items = set().union(*(sketch.counts for sketch in sketches)) if sketches else set()
+        counts = {item: sum(sketch.counts.get(item, sketch.floor) for sketch in sketches) for item in items}
+        errors = {item: sum(sketch.errors.get(item, sketch.floor) for sketch in sketches) for item in items}
+        kept = sorted(items, key=lambda item: (-counts[item], str(item)))
+        merged.total = sum(sketch.total for sketch in sketches)
+        merged.floor = sum(sketch.floor for sketch in sketches)
+        if len(kept) > merged.capacity:
+            merged.floor = max(merged.floor, counts[kept[merged.capacity]])
+            kept = kept[:merged.capacity]
+        for item in kept:
+            merged.counts[item] = counts[item]
+            merged.errors[item] = errors[item]
+            merged._push(item)
+        return merged
+
+    @property
+    def nbytes(self) -> int:
+        # Measured: both dicts, the heap and its (count, seq, item) tuples, and the float counters.
+        # Items are left out: they are the frame's own labels, shared rather than copied.
+        size = sys.getsizeof(self) + sys.getsizeof(self.counts) + sys.getsizeof(self.errors) + sys.getsizeof(self._heap)
+        for count, seq, _ in self._heap:
+            size += sys.getsizeof((count, seq, None)) + sys.getsizeof(count) + sys.getsizeof(seq)
+        return size + sum(sys.getsizeof(count) + sys.getsizeof(error) for count, error in zip(self.counts.values(), self.errors.values()))
+
+    @property
+    def exact(self) -> bool:
+        return self.floor == 0
+
+    def top(self, k: int) -> List[Tuple[Any, float, float]]:
+        ranked = sorted(self.counts, key=lambda item: (-self.counts[item], str(item)))
+        return [(item, self.counts[item], self.errors[item]) for item in ranked[:k]]
+
+    def guaranteed(self, k: int) -> int:
+        # Items whose lower bound beats every count outside the shown top-k
+        ranked = sorted(self.counts.values(), reverse=True)
+        threshold = max(ranked[k] if len(ranked) > k else 0.0, self.floor)
+        return sum(count - error >= threshold for _, count, error in self.top(k))
+
+
+def sketch_values(df: pd.DataFrame, column: str) -> pd.Series:
+    # The same labels the exact breakdowns use
+    if column == 'network':
+        return df['network'].str.strip().str.title()
+    if column == 'promoCode' and 'promoCode_clean' in df.columns:
+        return df['promoCode_clean']
+    return df[column]
+
+
+class SketchIndex:
+    # One Space-Saving summary per (column, country, month), built once per dataset
+    # in row chunks. A date range merges the summaries of the months it fully
+    # covers; its partial boundary months are counted exactly from the filtered rows.
+    def __init__(self, df: pd.DataFrame, columns: Iterable[str] = SKETCH_COLUMNS, capacity: int = SKETCH_CAPACITY,
+                 chunk_rows: int = SKETCH_CHUNK_ROWS):
+        self.capacity = capacity
+        self.columns = [column for column in columns if column in df.columns]
+        self.sketches: Dict[str, Dict[Tuple[Any, pd.Period], SpaceSaving]] = {column: {} for column in self.columns}
+        for offset in range(0, len(df), chunk_rows):
+            chunk = df.iloc[offset:offset + chunk_rows]
+            months = chunk['transaction_month'].dt.to_period('M')
+            # Exports without a country column keep a single cell per month
+            countries = chunk['country'] if 'country' in chunk.columns else pd.Series(None, index=chunk.index, dtype=object)
+            weights = row_weights(chunk)
+            for column in self.columns:
+                values = sketch_values(chunk, column)
+                counts = weights.groupby([countries, months, values], observed=True, dropna=False).sum()
+                counts = counts[counts.index.get_level_values(2).notna()]
+                by_cell = self.sketches[column]
+                for (country, month), cell_counts in counts.groupby(level=[0, 1], dropna=False):
+                    sketch = by_cell.setdefault((country, month), SpaceSaving(capacity))
+                    for item, weight in cell_counts.droplevel([0, 1]).sort_values(ascending=False, kind='stable').items():
+                        sketch.update(item, float(weight))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(sys.getsizeof(cells) + sum(sketch.nbytes for sketch in cells.values()) for cells in self.sketches.values())
+
+    def merged(self, column: str, start: dt.date, end: dt.date, country: Optional[str] = None,
+               frame: Optional[pd.DataFrame] = None) -> SpaceSaving:
+        first, last = pd.Period(start, 'M'), pd.Period(end, 'M')
+        full = [
+            sketch for (cell_country, month), sketch in self.sketches.get(column, {}).items()
+            if (country is None or cell_country == country)
+            and month.start_time.date() >= start and month.end_time.date() <= end
+        ]
+        partial = {month for month in (first, last) if month.start_time.date() < start or month.end_time.date() > end}
+        if partial and frame is not None and column in frame.columns:
+            rows = frame[frame['transaction_month'].dt.to_period('M').isin(partial)]
+            counts = row_weights(rows).groupby(sketch_values(rows, column), observed=True).sum()
+            if not counts.empty:
+                full.append(SpaceSaving.from_counts(counts, max(self.capacity, len(counts))))
+        return SpaceSaving.merge(full, self.capacity)
+
+    def top_with_other(self, column: str, start: dt.date, end: dt.date, country: Optional[str] = None,
+                       frame: Optional[pd.DataFrame] = None, k: int = 10) -> Tuple[pd.DataFrame, str]:
+        # Top-k labels plus an "Other" slice for the remaining total, and a caption with the error bounds.
+        # `frame` holds the rows already filtered to [start, end] and country.
+        sketch = self.merged(column, start, end, country, frame)
+        top = sketch.top(k)
+        frame = pd.DataFrame({'label': [item for item, _, _ in top], 'value': [count for _, count, _ in top]})
+        other = sketch.total - frame['value'].sum()
+        if other > 0.5:
+            frame = pd.concat([frame, pd.DataFrame({'label': ['Other'], 'value': [other]})], ignore_index=True)
+        # Weighted sample counts are estimates; show them as whole numbers
+        frame['value'] = frame['value'].round()
+        if sketch.exact:
+            return frame, f"Exact counts: no monthly sketch overflowed its {sketch.capacity} counters."
+        max_error = max((error for _, _, error in top), default=0.0)
+        caption = (
+            f"Approximate top {len(top)} from mergeable Space-Saving sketches: each count overestimates "
+            f"by at most {max_error:,.0f} (bound {sketch.total / sketch.capacity:,.0f} = total / {sketch.capacity}); "
+            f"{sketch.guaranteed(k)} of {len(top)} labels are guaranteed to be in the true top {k}."
+        )
+        return frame, caption
@@ -1,14 +1,35 @@
 import pandas as pd
 import datetime as dt
 
+from src.sampling import weighted_counts, with_customer_weights
+
+
 def monthly_summary_by_channel(df: pd.DataFrame) -> pd.DataFrame:
-    grouped = df.groupby(['transaction_month', 'distributionChannel']).size().reset_index(name='Total Transactions')
+    grouped = weighted_counts(df, ['transaction_month', 'distributionChannel']).reset_index(name='Total Transactions')
     return grouped
 
+
 def monthly_customer_stats(df: pd.DataFrame) -> pd.DataFrame:
-    total_customers = df.groupby('transaction_month')['customer_id'].nunique().reset_index(name='Active Customers')
-    new_customers = df[df['nbTransactionsPaid'] == 1].groupby('transaction_month')['customer_id'].nunique().reset_index(name='New Customers')
+    total_customers = weighted_counts(df, 'transaction_month', 'customer_id').reset_index(name='Active Customers')
+    new_customers = weighted_counts(df[df['nbTransactionsPaid'] == 1], 'transaction_month', 'customer_id').reset_index(name='New Customers')
     combined = pd.merge(total_customers, new_customers, on='transaction_month', how='left')
     combined['New Customers'] = combined['New Customers'].fillna(0).astype(int)
     combined['Month-Year'] = combined['transaction_month'].dt.strftime('%B %Y')
-    return combined 
\ No newline at end of file
+    return combined
+
+
+def customer_table(df: pd.DataFrame) -> pd.DataFrame:
+    # One row per customer: first/last transaction, transaction count and amount sent
+    grouped = df.groupby('customer_id')
+    table = pd.DataFrame({
+        'first_transaction': grouped['transaction_date'].min(),
+        'last_transaction': grouped['transaction_date'].max(),
+        'transactions': grouped.size(),
+    })
+    if 'amountToSend' in df.columns:
+        table['amount'] = grouped['amountToSend'].sum()
+    return with_customer_weights(table.reset_index(), df)
+
+
+def monthly_summaries(df: pd.DataFrame) -> tuple:
+    return monthly_summary_by_channel(df), monthly_customer_stats(df)
@@ -0,0 +1,138 @@
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# UTC designator or numeric offset after a time of day. Dropping it keeps each
+# timestamp's own wall time, which is what to_datetime(...).dt.tz_localize(None) produced,
+# and also works when one file mixes offsets.
+TZ_SUFFIX = r'(?P<time>\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)\s*(?P<offset>Z|UTC|[+-]\d{2}(?::?\d{2})?)$'
+ISO_8601 = re.compile(r'^\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,9})?)?)?$')
+# Non-ISO layouts seen in exports, tried in order on a sample. Month-first comes
+# before day-first, as in pandas, so a sample with no day above 12 reads month-first;
+# day-first wins only when the sample proves it.
+FORMATS = [
+    '%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M', '%m/%d/%Y',
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y',
+    '%m-%d-%Y %H:%M:%S', '%m-%d-%Y',
+    '%d-%m-%Y %H:%M:%S', '%d-%m-%Y',
+    '%Y/%m/%d %H:%M:%S', '%Y/%m/%d',
+]
+SAMPLE_SIZE = 1000
+# Distinct strings are parsed once when the leading rows show enough repeats
+DEDUPE_CHECK_ROWS = 10_000
+DEDUPE_MAX_DISTINCT_SHARE = 0.7
+# UTC designators cut by width when every row of a column ends with the same one
+UTC_SUFFIXES = ('Z', '+00:00')
+MAX_EXAMPLES = 5
+# DataFrame.attrs key holding the unparsed-row report of a loaded dataset
+ATTR = 'unparsed_timestamps'
+
+
+def strip_offsets(text: pd.Series) -> pd.Series:
+    # Any supported suffix, by regex; used on samples and on rows the fast path missed
+    return text.astype(str).str.strip().str.replace(TZ_SUFFIX, r'\g<time>', regex=True)
+
+
+def strip_common_offsets(text: pd.Series) -> pd.Series:
+    # 'Z', '+HH:MM' and '+HHMM' after a time, with plain string operations: much cheaper than a regex
+    text = text.astype(str).str.strip().str.rstrip('Z')
+    tail = text.str.slice(-6)
+    for width in (6, 5):
+        signed = tail.str.slice(-width, -width + 1).isin(['+', '-'])
+        if not signed.any():
+            continue
+        offset = tail[signed].str.slice(-width + 1).str.replace(':', '', regex=False)
+        timed = text[signed].str.slice(0, -width).str.contains(':', regex=False)
+        rows = signed[signed].index[(offset.str.len().eq(4) & offset.str.isdigit() & timed).to_numpy()]
+        text[rows] = text[rows].str.slice(0, -width)
+        tail[rows] = ''
+    return text
+
+
+def strip_utc_suffix(text: pd.Series) -> Optional[pd.Series]:
+    # Exports stamped uniformly in UTC: one suffix check and a fixed-width slice, no
+    # per-row offset search. None when the rows do not all share the suffix.
+    sample = text.iloc[:SAMPLE_SIZE].dropna()
+    for suffix in UTC_SUFFIXES:
+        if len(sample) and sample.str.endswith(suffix).all() and text.str.endswith(suffix, na=True).all():
+            return text.str.slice(0, -len(suffix))
+    return None
+
+
+def detect_format(sample: pd.Series) -> Optional[str]:
+    # 'ISO8601' fast path, else the first fixed format that parses the whole sample;
+    # None leaves the layout to pandas' mixed-format parser
+    sample = sample.dropna()
+    if sample.empty or sample.str.match(ISO_8601).all():
+        return 'ISO8601'
+    for fmt in FORMATS:
+        if pd.to_datetime(sample, format=fmt, errors='coerce').notna().all():
+            return fmt
+    return None
+
+
+def sample_format(values: pd.Series) -> str:
+    # Layout of a column from an evenly spaced sample: 'ISO8601', a fixed format, or
+    # 'mixed' for pandas' per-string parser
+    step = max(len(values) // SAMPLE_SIZE, 1)
+    return detect_format(strip_offsets(values.iloc[::step].iloc[:SAMPLE_SIZE].dropna())) or 'mixed'
+
+
+def parse_timestamps(values: pd.Series, column: Optional[str] = None, fmt: Optional[str] = None) -> Tuple[pd.Series, Optional[Dict[str, Any]]]:
+    # Naive datetimes from timestamp strings, plus a report of the rows that did not
+    # parse (NaT) instead of coercing them silently. The format is detected from a
+    # sample unless given (e.g. once per file), and repeated strings are parsed once.
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return (values.dt.tz_localize(None) if values.dt.tz is not None else values), None
+    head = values.iloc[:DEDUPE_CHECK_ROWS]
+    if head.nunique() <= DEDUPE_MAX_DISTINCT_SHARE * len(head):
+        codes, uniques = pd.factorize(values)
+        text = pd.Series(uniques, dtype=object)
+    else:
+        codes, text = None, values.reset_index(drop=True)
+    fmt = fmt or sample_format(text)
+    # Naive strings parse several times faster than offset-aware ones, so suffixes go first
+    naive = strip_utc_suffix(text) if pd.api.types.is_object_dtype(text) else None
+    parsed = pd.to_datetime(strip_common_offsets(text) if naive is None else naive, format=fmt, errors='coerce', cache=False)
+    if not pd.api.types.is_datetime64_dtype(parsed):
+        # An offset the cheap strip does not know made the result tz-aware or mixed
+        parsed = pd.to_datetime(strip_offsets(text), format=fmt, errors='coerce', cache=False)
+    failed = parsed.isna() & text.notna()
+    if failed.any():
+        # Rarer suffixes, or a second layout the sample missed: retry just those strings
+        parsed[failed] = pd.to_datetime(strip_offsets(text[failed]), format='mixed', errors='coerce', cache=False)
+        failed = parsed.isna() & text.notna()
+    parsed_values = parsed.to_numpy(dtype='datetime64[ns]')
+    report = None
+    if codes is None:
+        result = parsed_values
+        if failed.any():
+            rows = np.flatnonzero(failed.to_numpy())
+            report = {'column': column or values.name, 'rows': len(rows), 'examples': list(dict.fromkeys(text.iloc[rows[:50]].astype(str)))[:MAX_EXAMPLES]}
+    else:
+        result = np.full(len(codes), np.datetime64('NaT'), dtype='datetime64[ns]')
+        known = codes >= 0
+        result[known] = parsed_values[codes[known]]
+        failed_codes = np.flatnonzero(failed.to_numpy())
+        if len(failed_codes):
+            report = {
+                'column': column or values.name,
+                'rows': int(np.isin(codes, failed_codes).sum()),
+                'examples': [str(uniques[i]) for i in failed_codes[:MAX_EXAMPLES]],
+            }
+    return pd.Series(result, index=values.index, name=values.name), report
+
+
+def merge_reports(reports: Sequence[Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    # Combine the per-chunk / per-file reports of one dataset
+    reports = [report for report in reports if report]
+    if not reports:
+        return None
+    examples: List[str] = list(dict.fromkeys(example for report in reports for example in report['examples']))
+    return {
+        'column': reports[0]['column'],
+        'rows': sum(report['rows'] for report in reports),
+        'examples': examples[:MAX_EXAMPLES],
+    }
@@ -1,18 +1,39 @@
+import numpy as np
 import pandas as pd
 
+def group_top_n_with_other_batch(df, group_col, value_col, label_col='ville', top_n=8):
+    # Top-N plus "Other" for every group of a long (group, label, value) frame, in one vectorized pass:
+    # a single sort by (group, -value, input order) ranks every row within its group, rows ranked
+    # below N are kept, and the rest is summed per group for "Other".
+    # Ties on the N-th value keep input order, and the output keeps group order of first appearance.
+    groups, group_keys = pd.factorize(df[group_col])
+    labels = df[label_col].to_numpy()
+    values = df[value_col].to_numpy()
+    n_groups = len(group_keys)
+    order = np.lexsort((np.arange(len(values)), -values, groups))
+    sorted_groups = groups[order]
+    rank = np.arange(len(order)) - np.searchsorted(sorted_groups, sorted_groups)
+    kept, rest = order[rank < top_n], order[rank >= top_n]
+    other = np.bincount(groups[rest], weights=values[rest], minlength=n_groups)
+    if np.issubdtype(values.dtype, np.integer):
+        other = other.round().astype(values.dtype)
+    other_groups = np.unique(groups[rest])
+    # Kept rows are already in (group, -value) order; each "Other" row goes after its group's rows
+    out_groups = np.concatenate([groups[kept], other_groups])
+    position = np.argsort(out_groups * 2 + np.r_[np.zeros(len(kept), dtype=np.int64), np.ones(len(other_groups), dtype=np.int64)], kind='stable')
+    combined_df = pd.DataFrame({
+        group_col: group_keys.take(out_groups[position]),
+        label_col: np.concatenate([labels[kept], np.full(len(other_groups), 'Other', dtype=object)])[position] if len(other_groups) else labels[kept][position],
+        value_col: np.concatenate([values[kept], other[other_groups]])[position],
+    })
+    totals = combined_df.groupby(group_col, sort=False)[value_col].sum()
+    combined_df['Percentage'] = (combined_df[value_col] / combined_df[group_col].map(totals) * 100).round(2)
+    return combined_df, totals
+
 def group_top_n_with_other(df, value_col, label_col='ville', top_n=8):
-    df_sorted = df.sort_values(by=value_col, ascending=False).reset_index(drop=True)
-    top_df = df_sorted.iloc[:top_n].copy()
-    other_df = df_sorted.iloc[top_n:]
-    if not other_df.empty:
-        other_sum = other_df[value_col].sum()
-        other_row = pd.DataFrame({label_col: ['Other'], value_col: [other_sum]})
-        combined_df = pd.concat([top_df[[label_col, value_col]], other_row], ignore_index=True)
-    else:
-        combined_df = top_df[[label_col, value_col]]
-    total = combined_df[value_col].sum()
-    combined_df['Percentage'] = (combined_df[value_col] / total * 100).round(2)
-    return combined_df, total
+    combined_df, totals = group_top_n_with_other_batch(df.assign(_group=0), '_group', value_col, label_col=label_col, top_n=top_n)
+    total = totals.iloc[0] if len(totals) else 0
+    return combined_df[[label_col, value_col, 'Percentage']], total
 
 def get_summary(df, year, month):
     filtered = df[(df['transaction_date'].dt.year == year) & (df['transaction_date'].dt.month == month)]
@@ -0,0 +1,86 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from src.cohort import CohortEngine
+from src.registry import DatasetEntry
+from src.rfm import compute_rfm
+from src.summary import customer_table, monthly_summaries
+
+# Expensive derived artifacts in the order they are warmed up after ingestion
+ARTIFACTS = [
+    ('customers', customer_table),
+    ('cohort', CohortEngine),
+    ('rfm', compute_rfm),
+    ('monthly', monthly_summaries),
+]
+
+# Threads rather than processes: the builders only read the shared frame, and pandas
+# releases the GIL in most of the heavy groupby work. Jobs run in submission order.
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('EASY_DASHBOARD_WARMUP_WORKERS', '2')),
+    thread_name_prefix='warmup'
+)
+_futures: Dict[Tuple[str, Any], Future] = {}
+# Sessions waiting on each queued job, and the jobs each session asked for last
+_waiting: Dict[Tuple[str, Any], Set[Optional[str]]] = {}
+_session_jobs: Dict[Optional[str], List[Tuple[str, Any]]] = {}
+_lock = threading.RLock()
+
+
+def start_warmup(entry: DatasetEntry, filter_key: tuple, df: pd.DataFrame, session_id: Optional[str] = None) -> None:
+    job_keys = [(entry.key, (name,) + filter_key) for name, _ in ARTIFACTS]
+    with _lock:
+        for stale in [sid for sid, keys in _session_jobs.items() if sid != session_id and not any(key in _futures for key in keys)]:
+            del _session_jobs[stale]
+        # A session that moved to another filter no longer needs its old jobs; the ones
+        # not yet running are cancelled unless another session still waits on them
+        for job_key in _session_jobs.get(session_id, []):
+            if job_key in job_keys:
+                continue
+            waiting = _waiting.get(job_key, set())
+            waiting.discard(session_id)
+            if not waiting and job_key in _futures and _futures[job_key].cancel():
+                _futures.pop(job_key, None)
+                _waiting.pop(job_key, None)
+        _session_jobs[session_id] = job_keys
+        for (name, builder), job_key in zip(ARTIFACTS, job_keys):
+            key = job_key[1]
+            if job_key not in _futures and entry.peek(key) is None:
+                future = _executor.submit(entry.index, key, partial(builder, df), evictable=True)
+                _futures[job_key] = future
+                future.add_done_callback(partial(_forget_if_ok, job_key))
+            if job_key in _futures:
+                _waiting.setdefault(job_key, set()).add(session_id)
+
+
+def _forget_if_ok(future_key: Tuple[str, Any], future: Future) -> None:
+    # Finished artifacts live on the dataset entry; only failures are kept to be reported
+    with _lock:
+        _waiting.pop(future_key, None)
+        if future.cancelled() or future.exception() is None:
+            if _futures.get(future_key) is future:
+                _futures.pop(future_key, None)
+
+
+def get_artifact(entry: DatasetEntry, name: str, filter_key: tuple) -> Optional[Any]:
+    # Ready artifact, or None while it is still being computed; re-raises build errors
+    key = (name,) + filter_key
+    artifact = entry.peek(key)
+    if artifact is not None:
+        return artifact
+    future = _futures.get((entry.key, key))
+    if future is not None and future.done() and not future.cancelled() and future.exception() is not None:
+        with _lock:
+            _futures.pop((entry.key, key), None)
+        raise future.exception()
+    return None
+
+
+def warmup_progress(entry: DatasetEntry, filter_key: tuple) -> Tuple[int, int]:
+    ready = sum(entry.peek((name,) + filter_key) is not None for name, _ in ARTIFACTS)
+    return ready, len(ARTIFACTS)
@@ -0,0 +1,50 @@
+import datetime as dt
+import io
+import tracemalloc
+
+import numpy as np
+
+from loadtest import synthetic_csv
+from src.cohort import CohortEngine
+from src.data_loader import filter_data, load_and_preprocess_data
+
+ROWS = 200_000
+# Multiples of the loaded frame's deep size. Loading may hold the frame plus parser
+# buffers. Filtering and cohorts work on views: about 0.4 on this data, where one
+# defensive copy of the filtered frames pushes it to about 0.6.
+MAX_LOAD_PEAK = 1.5
+MAX_PIPELINE_PEAK = 0.5
+START = dt.datetime(2024, 5, 1)
+END = dt.datetime(2025, 6, 30, 23, 59, 59)
+
+
+def test_filter_and_cohort_peak_memory_is_bounded_by_raw_frame_size():
+    data = synthetic_csv(ROWS)
+    tracemalloc.start()
+    try:
+        df = load_and_preprocess_data(io.BytesIO(data))
+        raw = df.memory_usage(deep=True).sum()
+        _, load_peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+
+        everything = filter_data(df, START, END)
+        tunisia = filter_data(df, START, END, 'TUN')
+        CohortEngine(everything).retention('customers')
+        CohortEngine(tunisia).retention('revenue')
+        _, pipeline_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert load_peak < MAX_LOAD_PEAK * raw
+    assert pipeline_peak - baseline < MAX_PIPELINE_PEAK * raw
+
+
+def test_unfiltered_range_shares_the_frame_without_exposing_it():
+    df = load_and_preprocess_data(io.BytesIO(synthetic_csv(1_000)))
+    filtered = filter_data(df, START, END)
+    assert np.shares_memory(filtered['amountToSend'].to_numpy(), df['amountToSend'].to_numpy())
+    filtered['amountToSend'] = 0.0
+    filtered.loc[filtered.index[0], 'country'] = 'XXX'
+    assert df['amountToSend'].sum() > 0
+    assert not (df['country'] == 'XXX').any()
@@ -0,0 +1,56 @@
+import datetime as dt
+import gc
+import io
+import tracemalloc
+from collections import OrderedDict
+
+from loadtest import synthetic_csv
+from src import plots
+from src.cohort import GRANULARITIES, METRICS, CohortEngine
+from src.data_loader import filter_data, load_and_preprocess_data
+
+ROWS = 20_000
+# Over a thousand tab 3 reruns; the figure cache reaches its byte cap well before the second half
+SOAK_ROUNDS = 1_200
+PLATEAU_ROUND = 600
+# Allocator and interpreter noise on top of the figure cache's own byte cap
+SLACK_BYTES = 4 * 1024 * 1024
+START = dt.date(2024, 5, 1)
+
+
+def render(df, round_no):
+    # Every round asks for a different range, country, granularity and metric, like a session rerunning tab 3
+    granularity = list(GRANULARITIES)[round_no % len(GRANULARITIES)]
+    metric = list(METRICS)[round_no % len(METRICS)]
+    country = [None, 'TUN', 'MAC'][round_no % 3]
+    end = START + dt.timedelta(days=120 + round_no % 300)
+    df_filtered = filter_data(df, dt.datetime.combine(START, dt.time()), dt.datetime.combine(end, dt.time(23, 59, 59)), country)
+    retention, cohort_labels = CohortEngine(df_filtered, granularity).retention(metric)
+    plots.plot_cohort_heatmap(retention, cohort_labels, country or 'All', GRANULARITIES[granularity], METRICS[metric]).to_json()
+
+
+def test_repeated_cohort_heatmaps_do_not_grow_memory(monkeypatch):
+    # Start from an empty cache, but keep the real FIGURE_CACHE_BYTES cap
+    monkeypatch.setattr(plots, '_figure_cache', OrderedDict())
+    monkeypatch.setattr(plots, '_figure_cache_bytes', 0)
+    df = load_and_preprocess_data(io.BytesIO(synthetic_csv(ROWS)))
+    tracemalloc.start()
+    try:
+        gc.collect()
+        baseline, _ = tracemalloc.get_traced_memory()
+        for round_no in range(PLATEAU_ROUND):
+            render(df, round_no)
+        gc.collect()
+        plateau, _ = tracemalloc.get_traced_memory()
+        for round_no in range(PLATEAU_ROUND, SOAK_ROUNDS):
+            render(df, round_no)
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # The real byte cap was reached and held
+    assert plots.FIGURE_CACHE_BYTES // 2 < plots._figure_cache_bytes <= plots.FIGURE_CACHE_BYTES
+    # Bounded by the cache cap overall, and flat once the cache is full
+    assert current - baseline < plots.FIGURE_CACHE_BYTES + SLACK_BYTES
+    assert current - plateau < SLACK_BYTES